@@ -1,9 +1,135 @@
-from flask import Flask, jsonify, request
-import joblib
+from flask import Flask, Response, jsonify, request
+import json
+import numpy as np
+import os
+from sklearn.datasets import load_iris
+
+import binary_format
+from batcher import MicroBatcher
+from model_store import ModelStore
+from prediction_cache import PredictionCache
 
 app = Flask(__name__)
 
-model = joblib.load('model.pkl')
+MODEL_PATH = 'model.pkl'
+
+FEATURES = ["sepal_length", "sepal_width", "petal_length", "petal_width"]
+
+# Rows serialized per chunk of a streamed batch response
+STREAM_CHUNK_ROWS = 10000
+
+# Micro-batching for /predict: concurrent requests are coalesced into one
+# model.predict call of up to BATCH_MAX_ROWS rows, waiting at most
+# BATCH_MAX_WAIT_MS for more to arrive. BATCH_MAX_ROWS=0 turns it off.
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", "0"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "2"))
+
+# MODEL_ENGINE=flat serves batches of up to FLAT_MAX_ROWS rows from the
+# forest flattened into NumPy arrays (same answers as sklearn, far less
+# per-call overhead); larger batches and MODEL_ENGINE=sklearn use the model.
+MODEL_ENGINE = os.environ.get("MODEL_ENGINE", "flat")
+FLAT_MAX_ROWS = int(os.environ.get("FLAT_MAX_ROWS", "1000"))
+
+# model.pkl is checked every MODEL_WATCH_SECONDS (0 turns it off); a new
+# version replaces the served one once it scores CANARY_MIN_ACCURACY on
+# the Iris rows. See /model for the version being served.
+MODEL_WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", "2"))
+CANARY_MIN_ACCURACY = float(os.environ.get("CANARY_MIN_ACCURACY", "0.9"))
+
+
+def model_swapped(loaded):
+    # Answers cached from the old model must not outlive it
+    if cache is not None:
+        cache.clear()
+
+
+store = ModelStore(MODEL_PATH, len(FEATURES), load_iris(return_X_y=True), CANARY_MIN_ACCURACY,
+                   MODEL_ENGINE == "flat", model_swapped)
+
+
+def estimator_for(n_rows):
+    loaded = store.current
+    if loaded.engine is not None and n_rows <= FLAT_MAX_ROWS:
+        return loaded.engine
+    return loaded.model
+
+
+def predict_rows(X):
+    return estimator_for(len(X)).predict(X)
+
+
+batcher = MicroBatcher(predict_rows, BATCH_MAX_ROWS, BATCH_MAX_WAIT_MS) if BATCH_MAX_ROWS > 0 else None
+
+
+def predict_uncached(X):
+    if batcher is not None:
+        return batcher.submit(X)
+    return predict_rows(X)
+
+
+# /predict answers from an LRU cache of up to CACHE_SIZE feature vectors
+# that lie on steps of CACHE_QUANTUM (the UI sliders move in 0.1 cm steps);
+# other rows go straight to the model. It is emptied whenever a new model
+# is swapped in. CACHE_SIZE=0 turns it off.
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "10000"))
+CACHE_QUANTUM = float(os.environ.get("CACHE_QUANTUM", "0.1"))
+
+cache = PredictionCache(predict_uncached, CACHE_SIZE, CACHE_QUANTUM) if CACHE_SIZE > 0 else None
+
+if MODEL_WATCH_SECONDS > 0:
+    store.watch(MODEL_WATCH_SECONDS)
+
+
+def to_matrix(payload):
+    # Records:  [{"sepal_length": 5.1, "sepal_width": 3.5, ...}, ...]
+    # Columnar: {"sepal_length": [5.1, ...], "sepal_width": [3.5, ...], ...}
+    if isinstance(payload, dict):
+        columns = [np.asarray(payload[name], dtype=np.float64) for name in FEATURES]
+        if any(column.ndim != 1 or len(column) != len(columns[0]) for column in columns):
+            raise ValueError("Columns must be lists of the same length")
+        return np.column_stack(columns)
+    if isinstance(payload, list):
+        matrix = np.array([[record[name] for name in FEATURES] for record in payload], dtype=np.float64)
+        return matrix.reshape(len(payload), len(FEATURES))
+    raise ValueError("Expected a list of records or an object of columns")
+
+
+def stream_predictions(predictions, probabilities):
+    # Writes {"predictions": [...], "probabilities": [[...], ...]} a chunk
+    # of rows at a time, so a large batch is never held as one string.
+    yield '{"predictions":['
+    for start in range(0, len(predictions), STREAM_CHUNK_ROWS):
+        chunk = json.dumps(predictions[start:start + STREAM_CHUNK_ROWS].tolist())[1:-1]
+        yield ("," if start else "") + chunk
+    yield '],"probabilities":['
+    for start in range(0, len(probabilities), STREAM_CHUNK_ROWS):
+        chunk = json.dumps(probabilities[start:start + STREAM_CHUNK_ROWS].tolist())[1:-1]
+        yield ("," if start else "") + chunk
+    yield ']}'
+
+
+def predict_binary(single):
+    # Answers a binary_format request: a float32/float64 matrix in, int8
+    # labels or, if the flag asks for them, float32 probabilities out
+    try:
+        X, want_probabilities = binary_format.decode_matrix(request.get_data(), len(FEATURES))
+        # The framing is fine, but the model cannot take inf or NaN
+        if not np.isfinite(X).all():
+            raise ValueError("Features must be finite numbers")
+    except ValueError as e:
+        return jsonify({"error": f"Bad matrix: {e}"}), 400
+    if single and len(X) != 1:
+        return jsonify({"error": f"Bad matrix: /predict takes one row, got {len(X)}"}), 400
+    estimator = estimator_for(len(X))
+    if want_probabilities:
+        probabilities = estimator.predict_proba(X) if len(X) else np.zeros((0, len(estimator.classes_)))
+        body = binary_format.encode_probabilities(probabilities)
+    elif single:
+        body = binary_format.encode_labels(cache.predict(X) if cache is not None else predict_uncached(X))
+    else:
+        body = binary_format.encode_labels(estimator.predict(X) if len(X) else np.zeros(0, dtype=np.int8))
+    return Response(body, mimetype=binary_format.CONTENT_TYPE)
+
 
 @app.route("/")
 
@@ -13,20 +139,55 @@ def home():
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    if request.mimetype == binary_format.CONTENT_TYPE:
+        return predict_binary(single=True)
     
     data = request.json
     
-    prediction = model.predict(
+    row = [
         [
-            [
-                data["sepal_length"],
-                data["sepal_width"],
-                data["petal_length"],
-                data["petal_width"]
-            ]
+            data["sepal_length"],
+            data["sepal_width"],
+            data["petal_length"],
+            data["petal_width"]
         ]
-    )
+    ]
+    X = np.array(row, dtype=np.float64)
+    prediction = cache.predict(X) if cache is not None else predict_uncached(X)
     return jsonify({"prediction": int(prediction[0])})
 
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    if request.mimetype == binary_format.CONTENT_TYPE:
+        return predict_binary(single=False)
+    try:
+        X = to_matrix(request.get_json())
+        # Flask's JSON parser accepts Infinity and NaN, which the model does not
+        if not np.isfinite(X).all():
+            raise ValueError("Features must be finite numbers")
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Bad batch: {e}"}), 400
+    if len(X) == 0:
+        return jsonify({"predictions": [], "probabilities": []})
+    # One call for the whole batch instead of one per row; predict() would
+    # only repeat predict_proba() and take the argmax
+    estimator = estimator_for(len(X))
+    probabilities = estimator.predict_proba(X)
+    predictions = estimator.classes_.take(np.argmax(probabilities, axis=1), axis=0)
+    return Response(stream_predictions(predictions, probabilities), mimetype="application/json")
+
+
+@app.route("/cache")
+def cache_stats():
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+
+@app.route("/model")
+def model_info():
+    return jsonify(store.info())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
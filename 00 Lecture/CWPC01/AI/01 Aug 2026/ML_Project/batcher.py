@@ -0,0 +1,83 @@
+import threading
+import time
+
+import numpy as np
+
+
+class PendingRows:
+    __slots__ = ("rows", "arrived", "done", "result", "error")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.arrived = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    # Coalesces rows from concurrent callers into one predict call. A batch
+    # is run as soon as max_rows rows are waiting, or max_wait_ms after the
+    # first of them arrived, and each caller gets back its own slice.
+    def __init__(self, predict, max_rows=64, max_wait_ms=2.0):
+        self.predict = predict
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self.ready = threading.Condition()
+        self.pending = []
+        self.pending_rows = 0
+        self.batches = 0
+        self.rows = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, rows):
+        item = PendingRows(rows)
+        with self.ready:
+            self.pending.append(item)
+            self.pending_rows += len(rows)
+            if len(self.pending) == 1 or self.pending_rows >= self.max_rows:
+                self.ready.notify()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def take_batch(self):
+        # Whole requests only, up to max_rows rows (always at least one request)
+        count, rows = 0, 0
+        while count < len(self.pending) and (count == 0 or rows + len(self.pending[count].rows) <= self.max_rows):
+            rows += len(self.pending[count].rows)
+            count += 1
+        batch = self.pending[:count]
+        del self.pending[:count]
+        self.pending_rows -= rows
+        return batch
+
+    def run(self):
+        while True:
+            with self.ready:
+                while not self.pending:
+                    self.ready.wait()
+                deadline = self.pending[0].arrived + self.max_wait
+                while self.pending_rows < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.ready.wait(remaining)
+                batch = self.take_batch()
+            try:
+                results = self.predict(np.concatenate([item.rows for item in batch]))
+                start = 0
+                for item in batch:
+                    item.result = results[start:start + len(item.rows)]
+                    start += len(item.rows)
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+            self.batches += 1
+            self.rows += sum(len(item.rows) for item in batch)
+            for item in batch:
+                item.done.set()
+
+    def stats(self):
+        return {"batches": self.batches, "rows": self.rows, "mean_batch_rows": self.rows / self.batches if self.batches else 0.0}
\ No newline at end of file
@@ -0,0 +1,329 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+import joblib
+import numpy as np
+from sklearn.datasets import load_iris
+from sklearn.ensemble import RandomForestClassifier
+from werkzeug.serving import make_server
+
+import app as app_module
+import binary_format
+from app import FEATURES, app
+from batcher import MicroBatcher
+from forest_engine import FlatForest
+from model_store import ModelStore
+from prediction_cache import PredictionCache
+
+
+def start_server():
+    # Runs the Flask app on a free local port in a background thread
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def post_json(url, payload):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())
+
+
+def post_raw(url, body, content_type):
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(req) as response:
+        return response.read()
+
+
+def make_rows(n, seed=0):
+    # Iris rows with a little noise, so the batch is not 150 rows repeated
+    X, _ = load_iris(return_X_y=True)
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), n)] + rng.normal(0, 0.05, (n, X.shape[1]))
+    return np.round(rows, 2)
+
+
+def bench_single(url, rows):
+    start = time.perf_counter()
+    predictions = [post_json(url + "/predict", dict(zip(FEATURES, row)))["prediction"] for row in rows.tolist()]
+    return predictions, time.perf_counter() - start
+
+
+def bench_batch(url, rows, layout):
+    if layout == "records":
+        payload = [dict(zip(FEATURES, row)) for row in rows.tolist()]
+    else:
+        payload = {name: rows[:, i].tolist() for i, name in enumerate(FEATURES)}
+    start = time.perf_counter()
+    result = post_json(url + "/predict_batch", payload)
+    return result["predictions"], time.perf_counter() - start
+
+
+def bench_batch_route(url, args):
+    rows = make_rows(args.rows)
+    single, single_time = bench_single(url, rows[:args.single_rows])
+    print(f"/predict, one row per request: {args.single_rows / single_time:10,.0f} rows/s")
+    for layout in ("records", "columns"):
+        predictions, batch_time = bench_batch(url, rows, layout)
+        assert predictions[:args.single_rows] == single
+        print(f"/predict_batch, {layout:<7}:       {args.rows / batch_time:10,.0f} rows/s ({batch_time:.2f} s for {args.rows:,} rows)")
+
+
+def concurrent_single(url, rows, concurrency):
+    # concurrency threads each post their share of rows to /predict one at
+    # a time; returns per-request latencies and the wall time
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(share):
+        mine = []
+        for row in share:
+            start = time.perf_counter()
+            post_json(url + "/predict", dict(zip(FEATURES, row)))
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(rows[i::concurrency],)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), time.perf_counter() - start
+
+
+def bench_microbatch(url, args):
+    rows = make_rows(args.single_rows).tolist()
+    print(f"{'window':>14} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'rows/batch':>11}")
+    windows = [(0, 0.0)] + [(max_rows, args.max_wait_ms) for max_rows in args.max_rows]
+    for max_rows, max_wait_ms in windows:
+        app_module.batcher = MicroBatcher(app_module.predict_rows, max_rows, max_wait_ms) if max_rows else None
+        label = f"{max_rows} rows/{max_wait_ms:g}ms" if max_rows else "off"
+        for concurrency in args.concurrency:
+            batches = app_module.batcher.batches if app_module.batcher else 0
+            latencies, elapsed = concurrent_single(url, rows, concurrency)
+            if app_module.batcher:
+                batch_rows = len(rows) / (app_module.batcher.batches - batches)
+            else:
+                batch_rows = 1.0
+            print(f"{label:>14} {concurrency:>8} {len(rows) / elapsed:>8,.0f} {np.percentile(latencies, 50) * 1e3:>8.1f} "
+                  f"{np.percentile(latencies, 99) * 1e3:>8.1f} {batch_rows:>11.1f}")
+    app_module.batcher = None
+
+
+def bench_engine(url, args):
+    # The same requests answered by sklearn and by the flat-array engine
+    rows = make_rows(args.single_rows)
+    current = app_module.store.current
+    flat_engine = current.engine or FlatForest.from_sklearn(current.model)
+    print(f"{'engine':>8} {'/predict rows/s':>16} {'batch of 100 ms':>16}")
+    results = {}
+    for name, engine in (("sklearn", None), ("flat", flat_engine)):
+        app_module.store.current = copy.copy(current)
+        app_module.store.current.engine = engine
+        results[name], single_time = bench_single(url, rows)
+        batch_times = [bench_batch(url, rows[start:start + 100], "columns")[1] for start in range(0, len(rows), 100)]
+        print(f"{name:>8} {len(rows) / single_time:>16,.0f} {np.median(batch_times) * 1e3:>16.2f}")
+    assert results["flat"] == results["sklearn"]
+    app_module.store.current = current
+
+
+def slider_trace(n, seed=0):
+    # Each user starts from one of the flowers, the first few far more
+    # often than the rest (Zipf), and nudges a slider 0.1 cm at a time, so
+    # most queries revisit grid points that were asked for before
+    X, _ = load_iris(return_X_y=True)
+    rng = np.random.default_rng(seed)
+    rows = []
+    while len(rows) < n:
+        row = X[(rng.zipf(1.5) - 1) % len(X)].copy()
+        for _ in range(rng.integers(3, 15)):
+            feature = rng.integers(X.shape[1])
+            row[feature] = max(0.1, round(row[feature] + rng.choice((-0.1, 0.1)), 1))
+            rows.append(row.copy())
+    return np.array(rows[:n])
+
+
+def bench_cache(url, args):
+    rows = slider_trace(args.trace_rows)
+    print(f"Trace: {len(rows):,} slider queries, {len(np.unique(rows, axis=0)):,} distinct")
+
+    # In process: the cost of answering the trace a row at a time
+    uncached = [app_module.predict_uncached(row[None, :]) for row in rows[:2000]]
+    start = time.perf_counter()
+    for row in rows[:2000]:
+        app_module.predict_uncached(row[None, :])
+    print(f"no cache:       {(time.perf_counter() - start) / 2000 * 1e6:8.1f} us/query")
+    for size in args.cache_sizes:
+        cache = PredictionCache(app_module.predict_uncached, size, 0.1)
+        start = time.perf_counter()
+        answers = [cache.predict(row[None, :]) for row in rows]
+        elapsed = time.perf_counter() - start
+        assert answers[:2000] == uncached
+        stats = cache.stats()
+        print(f"cache {size:>7,}: {elapsed / len(rows) * 1e6:8.1f} us/query, hit ratio {stats['hit_ratio']:.3f}, "
+              f"{stats['evictions']:,} evictions")
+
+    # Over HTTP, where request handling dominates
+    for size in (0, max(args.cache_sizes)):
+        app_module.cache = PredictionCache(app_module.predict_uncached, size, 0.1) if size else None
+        _, elapsed = bench_single(url, rows[:args.single_rows])
+        print(f"/predict, cache {size:>7,}: {args.single_rows / elapsed:8,.0f} req/s")
+    app_module.cache = None
+
+
+def bench_reload(url, args):
+    # Clients keep posting to /predict while a deploy loop rewrites the
+    # model file every 0.2 s, alternating two good models and, every third
+    # time, a truncated file that must be rejected
+    X, y = load_iris(return_X_y=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pkl")
+        good = []
+        for seed in (1, 2):
+            good_path = os.path.join(tmp, f"good{seed}.pkl")
+            joblib.dump(RandomForestClassifier(n_estimators=50, random_state=seed).fit(X, y), good_path)
+            with open(good_path, "rb") as f:
+                good.append(f.read())
+        with open(path, "wb") as f:
+            f.write(good[0])
+        saved = app_module.store
+        app_module.store = ModelStore(path, len(FEATURES), (X, y), on_swap=app_module.model_swapped)
+        app_module.store.watch(0.05)
+        deploying = threading.Event()
+
+        def deploy():
+            deploys = 0
+            while not deploying.is_set():
+                time.sleep(0.2)
+                deploys += 1
+                data = good[deploys % 2] if deploys % 3 else good[0][:len(good[0]) // 2]
+                with open(path, "wb") as f:
+                    f.write(data)
+
+        deployer = threading.Thread(target=deploy)
+        deployer.start()
+        try:
+            latencies, elapsed = concurrent_single(url, make_rows(args.single_rows).tolist(), 16)
+        finally:
+            deploying.set()
+            deployer.join()
+            info = json.loads(urllib.request.urlopen(url + "/model").read())
+            app_module.store = saved
+    print(f"{len(latencies):,} of {args.single_rows:,} requests answered in {elapsed:.2f} s "
+          f"(p99 {np.percentile(latencies, 99) * 1e3:.1f} ms)")
+    print(f"{info['reloads']} models swapped in, {info['failed_reloads']} bad files rejected, "
+          f"serving version {info['version']}")
+
+
+class CpuMeter:
+    # WSGI middleware adding up the CPU time request threads spend inside
+    # the app: reading and parsing the body, predicting and writing the
+    # whole response (streamed ones included)
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        start = time.thread_time()
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = list(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        elapsed = time.thread_time() - start
+        with self.lock:
+            self.seconds += elapsed
+        return body
+
+
+def bench_binary(url, args):
+    rows = make_rows(args.batch_rows)
+    single = rows[:1]
+    json_single = json.dumps(dict(zip(FEATURES, single[0].tolist()))).encode()
+    json_columns = json.dumps({name: rows[:, i].tolist() for i, name in enumerate(FEATURES)}).encode()
+    json_records = json.dumps([dict(zip(FEATURES, row)) for row in rows.tolist()]).encode()
+    matrix = binary_format.CONTENT_TYPE
+    cases = [
+        ("/predict", "JSON", "/predict", json_single, "application/json"),
+        ("/predict", "float32 -> labels", "/predict", binary_format.encode_matrix(single), matrix),
+        (f"batch {len(rows)}", "JSON columns", "/predict_batch", json_columns, "application/json"),
+        (f"batch {len(rows)}", "JSON records", "/predict_batch", json_records, "application/json"),
+        (f"batch {len(rows)}", "float32 -> labels", "/predict_batch", binary_format.encode_matrix(rows), matrix),
+        (f"batch {len(rows)}", "float64 -> labels", "/predict_batch", binary_format.encode_matrix(rows, np.float64), matrix),
+        (f"batch {len(rows)}", "float32 -> probas", "/predict_batch",
+         binary_format.encode_matrix(rows, probabilities=True), matrix),
+    ]
+    meter = CpuMeter(app.wsgi_app)
+    app.wsgi_app = meter
+    try:
+        print(f"{'route':>11} {'format':>18} {'request B':>10} {'reply B':>9} {'server CPU us':>14} {'wall ms':>8}")
+        for route, label, path, body, content_type in cases:
+            reply = post_raw(url + path, body, content_type)
+            before = meter.seconds
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                post_raw(url + path, body, content_type)
+            wall = (time.perf_counter() - start) / args.requests
+            cpu = (meter.seconds - before) / args.requests
+            print(f"{route:>11} {label:>18} {len(body):>10,} {len(reply):>9,} {cpu * 1e6:>14,.0f} {wall * 1e3:>8.2f}")
+    finally:
+        app.wsgi_app = meter.wsgi_app
+
+
+BENCHMARKS = {
+    "batch": bench_batch_route,
+    "microbatch": bench_microbatch,
+    "engine": bench_engine,
+    "cache": bench_cache,
+    "reload": bench_reload,
+    "binary": bench_binary,
+}
+
+
+def int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency of the Iris API routes")
+    parser.add_argument("benchmark", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--rows", type=int, default=100000, help="rows sent to /predict_batch")
+    parser.add_argument("--single-rows", type=int, default=1000, help="rows sent one at a time to /predict")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16, 64], help="client threads, comma-separated")
+    parser.add_argument("--max-rows", type=int_list, default=[16, 64], help="micro-batch sizes to try, comma-separated")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="micro-batch wait window")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="rows per batch for the binary benchmark")
+    parser.add_argument("--requests", type=int, default=300, help="requests per case for the binary benchmark")
+    parser.add_argument("--trace-rows", type=int, default=100000, help="queries in the slider trace")
+    parser.add_argument("--cache-sizes", type=int_list, default=[100, 1000, 10000], help="cache sizes, comma-separated")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmark if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    # The other benchmarks time the model itself, so they run with the
+    # prediction cache turned off
+    app_module.cache = None
+    server, url = start_server()
+    try:
+        for name in args.benchmark or BENCHMARKS:
+            print(f"== {name}")
+            BENCHMARKS[name](url, args)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+import struct
+
+import numpy as np
+
+# A compact alternative to JSON for /predict and /predict_batch. Both ways
+# a message is a 16-byte header followed by a little-endian row-major
+# matrix:
+#
+#   magic     4 bytes  b"IRIS"
+#   itemsize  uint8    request: 4 (float32) or 8 (float64) features
+#                      reply:   1 (int8 labels) or 4 (float32 probabilities)
+#   flags     uint8    request: bit 0 asks for probabilities instead of labels
+#   columns   uint16   features per row / 1 for labels / classes for probabilities
+#   rows      uint32
+#   reserved  uint32   zero; pads the header so float64 data is 8-byte aligned
+#
+# A request body is turned into an array with np.frombuffer, a view of the
+# received bytes rather than a parsed copy, and float32 rows go on to the
+# model without even a dtype conversion.
+CONTENT_TYPE = "application/x-iris-matrix"
+
+HEADER = struct.Struct("<4sBBHII")
+MAGIC = b"IRIS"
+WANT_PROBABILITIES = 1
+
+FEATURE_DTYPES = {4: np.dtype("<f4"), 8: np.dtype("<f8")}
+
+
+def encode_matrix(X, dtype=np.float32, probabilities=False):
+    X = np.ascontiguousarray(X, dtype=np.dtype(dtype).newbyteorder("<"))
+    if X.ndim != 2:
+        raise ValueError("Expected a 2D matrix")
+    flags = WANT_PROBABILITIES if probabilities else 0
+    return HEADER.pack(MAGIC, X.itemsize, flags, X.shape[1], X.shape[0], 0) + X.tobytes()
+
+
+def decode_matrix(data, n_features):
+    # Returns (X, probabilities wanted)
+    if len(data) < HEADER.size:
+        raise ValueError("Body shorter than the header")
+    magic, itemsize, flags, columns, rows, _ = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Bad magic")
+    if itemsize not in FEATURE_DTYPES:
+        raise ValueError(f"Features must be float32 or float64, not {itemsize}-byte items")
+    if columns != n_features:
+        raise ValueError(f"Expected {n_features} features per row, got {columns}")
+    if len(data) != HEADER.size + rows * columns * itemsize:
+        raise ValueError(f"Body has {len(data) - HEADER.size} bytes of data for {rows} rows of {columns} features")
+    X = np.frombuffer(data, FEATURE_DTYPES[itemsize], rows * columns, HEADER.size).reshape(rows, columns)
+    return X, bool(flags & WANT_PROBABILITIES)
+
+
+def encode_labels(labels):
+    labels = np.asarray(labels)
+    if labels.dtype.kind not in "iu" or (len(labels) and (labels.min() < -128 or labels.max() > 127)):
+        raise ValueError("Labels do not fit in int8")
+    return HEADER.pack(MAGIC, 1, 0, 1, len(labels), 0) + labels.astype(np.int8).tobytes()
+
+
+def encode_probabilities(probabilities):
+    probabilities = np.ascontiguousarray(probabilities, dtype="<f4")
+    return HEADER.pack(MAGIC, 4, 0, probabilities.shape[1], len(probabilities), 0) + probabilities.tobytes()
+
+
+def decode_result(data):
+    # Client side: labels as an int8 vector, probabilities as float32 rows
+    magic, itemsize, _, columns, rows, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or itemsize not in (1, 4):
+        raise ValueError("Not a prediction result")
+    result = np.frombuffer(data, "<i1" if itemsize == 1 else "<f4", rows * columns, HEADER.size)
+    return result if itemsize == 1 else result.reshape(rows, columns)
\ No newline at end of file
@@ -0,0 +1,251 @@
+import argparse
+import copy
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.datasets import load_iris
+
+from forest_engine import FlatForest
+
+# Leaf value encodings for the flat artifact: dtype and the scale the
+# probabilities are multiplied by before rounding (None: stored as is)
+PRECISIONS = {
+    "float64": (np.float64, None),
+    "float32": (np.float32, None),
+    "fixed16": (np.uint16, 65535),
+    "fixed8": (np.uint8, 255),
+}
+
+
+def prune_tree(tree, min_purity, min_samples):
+    # Returns a copy of a fitted sklearn Tree in which some internal nodes
+    # become leaves carrying their own class fractions:
+    #   - subtrees whose leaves all hold the same values (pure redundancy;
+    #     the copy predicts exactly what the original did)
+    #   - nodes whose majority class is at least min_purity of their samples
+    #   - nodes reached by fewer than min_samples training samples
+    left, right = tree.children_left, tree.children_right
+    values = tree.value[:, 0, :]
+    # uniform[n]: n's subtree gives the same values in every leaf
+    uniform = np.zeros(tree.node_count, dtype=bool)
+    for node in reversed(range(tree.node_count)):
+        # Children always come after their parent, so they are done first
+        if left[node] == -1:
+            uniform[node] = True
+        else:
+            uniform[node] = (uniform[left[node]] and uniform[right[node]]
+                             and np.array_equal(leaf_value(left[node], left, values), leaf_value(right[node], left, values)))
+
+    kept, node_values, leaves = [], [], []
+    new_index = {}
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        new_index[node] = len(kept)
+        kept.append(node)
+        leaf = (left[node] == -1 or uniform[node] or values[node].max() >= min_purity
+                or tree.n_node_samples[node] < min_samples)
+        node_values.append(leaf_value(node, left, values) if uniform[node] else values[node])
+        leaves.append(leaf)
+        if not leaf:
+            stack += [right[node], left[node]]
+
+    cls, args, state = tree.__reduce__()
+    nodes = state["nodes"][kept].copy()
+    for i, node in enumerate(kept):
+        if leaves[i]:
+            nodes[i]["left_child"] = nodes[i]["right_child"] = -1
+            nodes[i]["feature"] = -2
+            nodes[i]["threshold"] = -2.0
+        else:
+            nodes[i]["left_child"] = new_index[left[node]]
+            nodes[i]["right_child"] = new_index[right[node]]
+    depth = np.zeros(len(kept), dtype=np.intp)
+    for i in range(len(kept)):
+        if nodes[i]["left_child"] != -1:
+            depth[nodes[i]["left_child"]] = depth[nodes[i]["right_child"]] = depth[i] + 1
+    pruned = cls(*args)
+    pruned.__setstate__({
+        "max_depth": int(depth.max()),
+        "node_count": len(kept),
+        "nodes": nodes,
+        "values": np.array(node_values)[:, None, :].copy(),
+    })
+    return pruned
+
+
+def leaf_value(node, left, values):
+    # Values of the leftmost leaf under node (all leaves agree when used)
+    while left[node] != -1:
+        node = left[node]
+    return values[node]
+
+
+def prune_forest(model, min_purity, min_samples):
+    pruned = copy.deepcopy(model)
+    for estimator in pruned.estimators_:
+        estimator.tree_ = prune_tree(estimator.tree_, min_purity, min_samples)
+    return pruned
+
+
+def tree_probabilities(model, X):
+    # (trees, rows, classes), each tree's own predict_proba
+    return np.stack([estimator.predict_proba(X) for estimator in model.estimators_])
+
+
+def select_trees(per_tree, y, probe_per_tree, reference, tolerance, min_trees):
+    # Backward elimination: repeatedly drop the tree whose removal keeps
+    # accuracy on (X, y) highest, ties going to the best agreement with the
+    # original forest on the probe rows. Stops before accuracy falls more
+    # than tolerance below the full forest's, or agreement below 1 - tolerance.
+    kept = list(range(len(per_tree)))
+    total, probe_total = per_tree.sum(axis=0), probe_per_tree.sum(axis=0)
+    floor = accuracy(total, y) - tolerance
+    while len(kept) > min_trees:
+        without = total[None] - per_tree[kept]
+        probe_without = probe_total[None] - probe_per_tree[kept]
+        accuracies = (np.argmax(without, axis=2) == y).mean(axis=1)
+        agreements = (np.argmax(probe_without, axis=2) == reference).mean(axis=1)
+        best = np.lexsort((agreements, accuracies))[-1]
+        if accuracies[best] < floor or agreements[best] < 1 - tolerance:
+            break
+        total, probe_total = without[best], probe_without[best]
+        del kept[best]
+    return kept
+
+
+def accuracy(probabilities, y):
+    return (np.argmax(probabilities, axis=-1) == y).mean()
+
+
+def round_down_float32(threshold):
+    # Largest float32 not above each threshold. Features are compared as
+    # float32, and for any float32 x, x <= t exactly when x <= this value,
+    # so the narrower thresholds send every row down the same branches.
+    narrow = threshold.astype(np.float32)
+    above = narrow > threshold
+    narrow[above] = np.nextafter(narrow[above], np.float32(-np.inf))
+    return narrow
+
+
+def flat_arrays(model, precision):
+    engine = FlatForest.from_sklearn(model)
+    dtype, scale = PRECISIONS[precision]
+    node_count = len(engine.feature)
+    index_type = np.int16 if node_count < 2 ** 15 else np.int32
+    data = {
+        "feature": engine.feature.astype(np.uint8 if engine.n_features < 256 else np.int32),
+        "threshold": round_down_float32(engine.threshold),
+        "children": engine.children.astype(index_type),
+        "missing_left": engine.missing_left,
+        "value": (np.round(engine.value * scale) if scale else engine.value).astype(dtype),
+        "roots": engine.roots.astype(index_type),
+        "classes": engine.classes,
+        "n_features": engine.n_features,
+        "max_depth": engine.max_depth,
+        "value_scale": scale,
+    }
+    return data
+
+
+def timed_load(path, loader, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        loaded = loader(path)
+        best = min(best, time.perf_counter() - start)
+    return loaded, best
+
+
+def timed_predict(predict, X, min_time=0.2):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        predict(X)
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune, thin out and quantize model.pkl, and compare the results")
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--out", default="model_compressed.pkl", help="pruned sklearn forest, a drop-in model.pkl")
+    parser.add_argument("--flat-out", default="model_compressed.flat", help="flat-engine artifact with narrow types")
+    parser.add_argument("--min-purity", type=float, default=1.0,
+                        help="turn nodes whose majority class has at least this share into leaves (1.0: off)")
+    parser.add_argument("--min-samples", type=int, default=0, help="turn nodes with fewer training samples into leaves")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="allowed accuracy loss, and disagreement with the original on probe rows")
+    parser.add_argument("--min-trees", type=int, default=1)
+    parser.add_argument("--keep-all-trees", action="store_true", help="prune only, do not drop trees")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32", help="leaf values in the flat artifact")
+    parser.add_argument("--compress", type=int, default=3, help="joblib compression level for both artifacts")
+    parser.add_argument("--probe-rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Accuracy is measured on the Iris rows, which the model was trained
+    # on, so it flatters every variant; agreement with the original on
+    # random rows spread over the feature ranges shows how faithful the
+    # compressed forest is away from the training points.
+    X, y = load_iris(return_X_y=True)
+    rng = np.random.default_rng(args.seed)
+    probe = rng.uniform(X.min(axis=0), X.max(axis=0), (args.probe_rows, X.shape[1]))
+    original = joblib.load(args.model)
+    y = original.classes_.searchsorted(y)
+    reference = original.predict_proba(probe).argmax(axis=1)
+
+    model = prune_forest(original, args.min_purity, args.min_samples)
+    nodes_before = sum(e.tree_.node_count for e in original.estimators_)
+    nodes_after = sum(e.tree_.node_count for e in model.estimators_)
+    print(f"Pruning: {nodes_before:,} -> {nodes_after:,} nodes")
+    pruned_accuracy = accuracy(model.predict_proba(X), y)
+    pruned_agreement = (model.predict_proba(probe).argmax(axis=1) == reference).mean()
+    if pruned_accuracy < accuracy(original.predict_proba(X), y) - args.tolerance or pruned_agreement < 1 - args.tolerance:
+        raise ValueError(f"Pruning alone is off by more than {args.tolerance} (accuracy {pruned_accuracy:.3f}, "
+                         f"agreement {pruned_agreement:.3f}); raise --min-purity or lower --min-samples")
+
+    if not args.keep_all_trees:
+        kept = select_trees(tree_probabilities(model, X), y, tree_probabilities(model, probe), reference,
+                            args.tolerance, args.min_trees)
+        model.estimators_ = [model.estimators_[i] for i in sorted(kept)]
+        model.n_estimators = len(model.estimators_)
+        print(f"Tree selection: {len(original.estimators_)} -> {len(model.estimators_)} trees")
+
+    joblib.dump(model, args.out, compress=args.compress)
+    joblib.dump(flat_arrays(model, args.precision), args.flat_out, compress=args.compress)
+
+    # Same tree count, plain types: the flat engine before compression
+    plain_flat = os.path.splitext(args.flat_out)[0] + ".plain.flat"
+    FlatForest.from_sklearn(original).save(plain_flat)
+
+    rows = {"1 row": X[:1], "1000 rows": probe[:1000]}
+    variants = [("original .pkl", args.model, joblib.load)]
+    if args.compress:
+        # Separates what joblib's compression saves from what pruning does
+        recompressed = os.path.splitext(args.out)[0] + ".original.pkl"
+        joblib.dump(original, recompressed, compress=args.compress)
+        variants.append((f"original, compress={args.compress}", recompressed, joblib.load))
+    variants += [
+        ("compressed .pkl", args.out, joblib.load),
+        ("original flat", plain_flat, FlatForest.load),
+        (f"compressed flat ({args.precision})", args.flat_out, FlatForest.load),
+    ]
+    base_accuracy = accuracy(original.predict_proba(X), y)
+    print(f"{'artifact':>26} {'size KB':>8} {'load ms':>8} {'1 row ms':>9} {'1000 rows ms':>13} {'accuracy':>9} {'delta':>7} {'agreement':>10}")
+    for label, path, loader in variants:
+        loaded, load_time = timed_load(path, loader)
+        times = [timed_predict(loaded.predict_proba, batch) for batch in rows.values()]
+        variant_accuracy = accuracy(loaded.predict_proba(X), y)
+        agreement = (loaded.predict_proba(probe).argmax(axis=1) == reference).mean()
+        print(f"{label:>26} {os.path.getsize(path) / 1024:>8.1f} {load_time * 1e3:>8.1f} {times[0] * 1e3:>9.3f} "
+              f"{times[1] * 1e3:>13.3f} {variant_accuracy:>9.3f} {variant_accuracy - base_accuracy:>+7.3f} {agreement:>10.4f}")
+    os.remove(plain_flat)
+    if args.compress:
+        os.remove(recompressed)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,188 @@
+import argparse
+import time
+
+import joblib
+import numpy as np
+
+
+class FlatForest:
+    # Every tree of a fitted RandomForestClassifier laid end to end in flat
+    # arrays: node i splits on feature[i] at threshold[i] and goes to
+    # children[2 * i] (left) or children[2 * i + 1] (right); roots[t] is the
+    # first node of tree t. Leaves point at themselves, so walking max_depth
+    # steps from the roots lands every row on its leaf in every tree, one
+    # vectorized step at a time.
+    #
+    # The arithmetic follows sklearn's so results match it exactly: X is
+    # cast to float32 and compared with <= against float64 thresholds, the
+    # per-tree leaf probabilities are added up tree by tree in order and
+    # then divided by the number of trees.
+    ARRAYS = ("feature", "threshold", "children", "missing_left", "value", "roots", "classes")
+
+    # Rows evaluated at once; bounds the (rows, trees, classes) scratch array
+    CHUNK_ROWS = 4096
+
+    def __init__(self, feature, threshold, children, missing_left, value, roots, classes, n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.classes_ = classes
+        self.n_features = n_features
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+        features, thresholds, children, missing, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, 0.0, tree.threshold))
+            left = np.where(leaf, nodes, tree.children_left)
+            right = np.where(leaf, nodes, tree.children_right)
+            children.append(np.column_stack([left, right]).ravel() + offset)
+            missing_left = getattr(tree, "missing_go_to_left", None)
+            missing.append(np.zeros(tree.node_count, dtype=bool) if missing_left is None else missing_left.astype(bool))
+            value = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            # Older sklearn versions keep class counts in leaves and
+            # normalize them in predict_proba; newer ones store fractions.
+            totals = value.sum(axis=1, keepdims=True)
+            if not np.allclose(totals[leaf], 1.0):
+                totals[totals == 0] = 1.0
+                value = value / totals
+            values.append(value)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+        return cls(
+            np.concatenate(features).astype(np.intp),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(children).astype(np.intp),
+            np.concatenate(missing),
+            np.ascontiguousarray(np.concatenate(values)),
+            np.array(roots, dtype=np.intp),
+            np.asarray(forest.classes_),
+            forest.n_features_in_,
+            max_depth,
+        )
+
+    def save(self, path):
+        # Uncompressed, so joblib.load(path, mmap_mode="r") can map the arrays
+        data = {name: getattr(self, name) for name in self.ARRAYS}
+        data["n_features"] = self.n_features
+        data["max_depth"] = self.max_depth
+        joblib.dump(data, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        # With mmap_mode="r" every process that loads path shares one copy of
+        # the arrays in the page cache; np.asarray drops the np.memmap
+        # subclass, whose per-call overhead would land on every take()
+        data = joblib.load(path, mmap_mode=mmap_mode)
+        arrays = {name: np.asarray(data[name]) for name in cls.ARRAYS}
+        # Artifacts from compress_model.py store narrower types and maybe
+        # fixed-point leaf values; they are widened back here (plain
+        # artifacts already have these types and stay mapped)
+        if data.get("value_scale"):
+            arrays["value"] = arrays["value"] / data["value_scale"]
+        for name, dtype in (("feature", np.intp), ("children", np.intp), ("roots", np.intp),
+                            ("threshold", np.float64), ("value", np.float64)):
+            if arrays[name].dtype != dtype:
+                arrays[name] = arrays[name].astype(dtype)
+        return cls(**arrays, n_features=data["n_features"], max_depth=data["max_depth"])
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def check_input(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a 2D array with {self.n_features} features, got shape {X.shape}")
+        if np.isinf(X).any():
+            raise ValueError("Input X contains infinity")
+        return X
+
+    def apply(self, X):
+        # Leaf node reached in every tree, shape (rows, trees). Flat take()
+        # on the raveled X is cheaper than fancy indexing with two arrays.
+        X = np.ascontiguousarray(X)
+        flat = X.ravel()
+        row_start = (np.arange(len(X), dtype=np.intp) * X.shape[1])[:, None]
+        node = np.tile(self.roots, (len(X), 1))
+        for _ in range(self.max_depth):
+            x = flat.take(row_start + self.feature.take(node))
+            go_right = x > self.threshold.take(node)
+            missing = np.isnan(x)
+            if missing.any():
+                go_right = np.where(missing, ~self.missing_left.take(node), go_right)
+            node = self.children.take(2 * node + go_right)
+        return node
+
+    def predict_proba(self, X):
+        X = self.check_input(X)
+        proba = np.empty((len(X), len(self.classes)), dtype=np.float64)
+        for start in range(0, len(X), self.CHUNK_ROWS):
+            leaves = self.apply(X[start:start + self.CHUNK_ROWS])
+            # cumsum adds the trees one after another, like sklearn's loop
+            proba[start:start + len(leaves)] = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def time_call(func, X, min_time=0.2):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func(X)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model.pkl to flat arrays and compare with sklearn")
+    parser.add_argument("--model", default="model.pkl")
+    parser.add_argument("--out", default="model_flat.joblib")
+    parser.add_argument("--check-rows", type=int, default=100000, help="random rows compared with sklearn")
+    args = parser.parse_args()
+
+    from sklearn.datasets import load_iris
+
+    model = joblib.load(args.model)
+    engine = FlatForest.from_sklearn(model)
+    engine.save(args.out)
+    engine = FlatForest.load(args.out)
+    print(f"Exported {engine.n_trees} trees, {len(engine.feature):,} nodes, max depth {engine.max_depth} to {args.out}")
+
+    X, _ = load_iris(return_X_y=True)
+    rng = np.random.default_rng(0)
+    low, high = X.min(axis=0) - 1, X.max(axis=0) + 1
+    checks = np.vstack([X, rng.uniform(low, high, (args.check_rows, X.shape[1])), np.round(rng.uniform(low, high, (1000, X.shape[1])), 1)])
+    assert np.array_equal(engine.predict_proba(checks), model.predict_proba(checks)), "probabilities differ from sklearn"
+    assert np.array_equal(engine.predict(checks), model.predict(checks)), "predictions differ from sklearn"
+    print(f"Identical to sklearn on {len(checks):,} rows")
+
+    print(f"{'rows':>7} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>8}")
+    for n in (1, 10, 100, 1000, 10000):
+        batch = checks[:n]
+        sklearn_time = time_call(model.predict_proba, batch)
+        flat_time = time_call(engine.predict_proba, batch)
+        print(f"{n:>7} {sklearn_time * 1e3:>11.3f} {flat_time * 1e3:>9.3f} {sklearn_time / flat_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
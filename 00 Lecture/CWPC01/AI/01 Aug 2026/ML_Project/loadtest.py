@@ -0,0 +1,291 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+
+import binary_format
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+FEATURES = ["sepal_length", "sepal_width", "petal_length", "petal_width"]
+
+# Server modes, all started through serve.py on a free port:
+#   threaded  one process, a thread per request (what app.run gives)
+#   prefork   --workers processes sharing the parent's model pages
+#   mmap      prefork, with the flat engine memory-mapped by each worker
+SERVER_MODES = ("threaded", "prefork", "mmap")
+
+
+def parse_mix(text):
+    # "predict=8,batch100=1" sends 8 single-row /predict requests for every
+    # /predict_batch request of 100 rows. batchN sends columns, recordsN a
+    # list of records and binaryN a float32 matrix (see binary_format.py).
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not re.fullmatch(r"predict|(batch|records|binary)\d+", name):
+            raise ValueError(f"Unknown request type: {name}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def make_payloads(name, count, rng):
+    # (path, body, content type, rows) tuples, encoded up front so the
+    # clients spend their time waiting on the server rather than encoding
+    low, high = [4.3, 2.0, 1.0, 0.1], [7.9, 4.4, 6.9, 2.5]
+    payloads = []
+    for _ in range(count):
+        if name == "predict":
+            rows = np.round(rng.uniform(low, high, (1, 4)), 2)
+            path, body = "/predict", dict(zip(FEATURES, rows[0].tolist()))
+        elif name.startswith("batch"):
+            rows = np.round(rng.uniform(low, high, (int(name[5:]), 4)), 2)
+            path, body = "/predict_batch", {feature: rows[:, i].tolist() for i, feature in enumerate(FEATURES)}
+        elif name.startswith("records"):
+            rows = np.round(rng.uniform(low, high, (int(name[7:]), 4)), 2)
+            path, body = "/predict_batch", [dict(zip(FEATURES, row)) for row in rows.tolist()]
+        else:
+            rows = np.round(rng.uniform(low, high, (int(name[6:]), 4)), 2)
+            payloads.append(("/predict_batch", binary_format.encode_matrix(rows), binary_format.CONTENT_TYPE, len(rows)))
+            continue
+        payloads.append((path, json.dumps(body).encode(), "application/json", len(rows)))
+    return payloads
+
+
+def send(url, path, body, content_type):
+    req = urllib.request.Request(url + path, data=body, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        response.read()
+
+
+def client_process(url, mix, threads, warmup, seconds, seed, result):
+    # Runs threads closed-loop clients; each picks a request type by weight,
+    # sends it and waits for the answer before sending the next. Only
+    # requests that start after the warm-up and end before the deadline count.
+    rng = np.random.default_rng(seed)
+    payloads = {name: make_payloads(name, 50, rng) for name, _ in mix}
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    start = time.perf_counter() + warmup
+    deadline = start + seconds
+    samples = {name: {"latencies": [], "rows": 0, "errors": 0} for name in names}
+    lock = threading.Lock()
+
+    def worker(thread_seed):
+        pick = random.Random(thread_seed)
+        mine = {name: {"latencies": [], "rows": 0, "errors": 0} for name in names}
+        while True:
+            sent = time.perf_counter()
+            if sent >= deadline:
+                break
+            name = pick.choices(names, weights)[0]
+            path, body, content_type, rows = pick.choice(payloads[name])
+            try:
+                send(url, path, body, content_type)
+                ok = True
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                ok = False
+            done = time.perf_counter()
+            if sent >= start and done <= deadline:
+                if ok:
+                    mine[name]["latencies"].append(done - sent)
+                    mine[name]["rows"] += rows
+                else:
+                    mine[name]["errors"] += 1
+        with lock:
+            for name in names:
+                samples[name]["latencies"] += mine[name]["latencies"]
+                samples[name]["rows"] += mine[name]["rows"]
+                samples[name]["errors"] += mine[name]["errors"]
+
+    workers = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    result.put(samples)
+
+
+def summarize(latencies, rows, errors, seconds):
+    latencies = np.array(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / seconds,
+        "rows_per_second": rows / seconds,
+    }
+    if len(latencies):
+        summary.update({
+            "mean_ms": latencies.mean() * 1e3,
+            "p50_ms": np.percentile(latencies, 50) * 1e3,
+            "p95_ms": np.percentile(latencies, 95) * 1e3,
+            "p99_ms": np.percentile(latencies, 99) * 1e3,
+        })
+    return summary
+
+
+def run_level(url, args, concurrency):
+    # Client threads are spread over processes so one client's GIL does
+    # not become the bottleneck being measured
+    processes = min(concurrency, args.client_processes)
+    result = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(target=client_process, args=(url, args.mix, len(range(i, concurrency, processes)),
+                                                             args.warmup, args.seconds, args.seed + i, result))
+        for i in range(processes)
+    ]
+    for process in clients:
+        process.start()
+    merged = {name: {"latencies": [], "rows": 0, "errors": 0} for name, _ in args.mix}
+    for _ in clients:
+        for name, sample in result.get().items():
+            merged[name]["latencies"] += sample["latencies"]
+            merged[name]["rows"] += sample["rows"]
+            merged[name]["errors"] += sample["errors"]
+    for process in clients:
+        process.join()
+    everything = [latency for sample in merged.values() for latency in sample["latencies"]]
+    return {
+        "concurrency": concurrency,
+        "total": summarize(everything, sum(s["rows"] for s in merged.values()),
+                           sum(s["errors"] for s in merged.values()), args.seconds),
+        "by_request": {name: summarize(s["latencies"], s["rows"], s["errors"], args.seconds) for name, s in merged.items()},
+    }
+
+
+def start_server(args):
+    command = [sys.executable, "-W", "ignore", os.path.join(HERE, "serve.py"), "--host", "127.0.0.1", "--port", "0"]
+    if args.server == "threaded":
+        command += ["--workers", "1", "--threads"]
+    else:
+        command += ["--workers", str(args.workers)]
+    if args.server == "mmap":
+        command += ["--mmap", os.path.join(tempfile.gettempdir(), "model_flat.joblib")]
+    env = dict(os.environ)
+    env.update(args.env)
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=HERE, env=env)
+    line = server.stdout.readline()
+    if not line.startswith("Listening"):
+        server.kill()
+        raise RuntimeError("serve.py did not start")
+    server.stdout.readline()
+    return server, "http://127.0.0.1:" + line.rsplit(":", 1)[1].strip()
+
+
+def fetch_json(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return json.loads(response.read())
+    except urllib.error.URLError:
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    # Relative change against an earlier results file, level by level
+    with open(baseline_path) as f:
+        baseline = {level["concurrency"]: level["total"] for level in json.load(f)["levels"]}
+    print(f"vs {baseline_path}:")
+    for level in results["levels"]:
+        old = baseline.get(level["concurrency"])
+        if old is None or "p99_ms" not in old or "p99_ms" not in level["total"]:
+            continue
+        new = level["total"]
+        print(f"{level['concurrency']:>11}  req/s {(new['requests_per_second'] / old['requests_per_second'] - 1) * 100:+6.1f}%  "
+              f"p50 {(new['p50_ms'] / old['p50_ms'] - 1) * 100:+6.1f}%  p99 {(new['p99_ms'] / old['p99_ms'] - 1) * 100:+6.1f}%")
+
+
+def env_pair(text):
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text}")
+    return name, value
+
+
+def int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Iris API and write the results as JSON")
+    parser.add_argument("--url", help="test a server that is already running instead of starting one")
+    parser.add_argument("--server", choices=SERVER_MODES, default="threaded")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for prefork and mmap")
+    parser.add_argument("--env", type=env_pair, action="append", default=[],
+                        help="NAME=VALUE for the server, e.g. MODEL_ENGINE=sklearn or CACHE_SIZE=0; repeatable")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("predict=8,batch100=1"),
+                        help="request types and weights: predict, batchN (columns), recordsN, binaryN")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="client counts, comma-separated")
+    parser.add_argument("--client-processes", type=int, default=max(2, os.cpu_count()))
+    parser.add_argument("--seconds", type=float, default=10.0, help="measured time per concurrency level")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadtest_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        server, url = start_server(args)
+    try:
+        results = {
+            "meta": {
+                "started": datetime.now().isoformat(timespec="seconds"),
+                "url": url,
+                "server": "external" if args.url else args.server,
+                "workers": None if args.url or args.server == "threaded" else args.workers,
+                "env": dict(args.env),
+                "mix": dict(args.mix),
+                "seconds": args.seconds,
+                "model": fetch_json(url + "/model"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+            },
+            "levels": [],
+        }
+        print(f"{'concurrency':>11} {'request':>11} {'req/s':>8} {'rows/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for concurrency in args.concurrency:
+            level = run_level(url, args, concurrency)
+            results["levels"].append(level)
+            for name, summary in [("all", level["total"])] + list(level["by_request"].items()):
+                if not summary["requests"]:
+                    continue
+                print(f"{concurrency:>11} {name:>11} {summary['requests_per_second']:>8,.0f} {summary['rows_per_second']:>10,.0f} "
+                      f"{summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} {summary['errors']:>6}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
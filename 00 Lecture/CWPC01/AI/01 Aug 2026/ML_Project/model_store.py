@@ -0,0 +1,131 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from forest_engine import FlatForest
+
+
+class LoadedModel:
+    # One loaded version of the model file. Requests take store.current once
+    # and use that object throughout, so a swap never mixes two models
+    # inside one request, and requests already running finish on the old one.
+    def __init__(self, model, engine, version, path, loaded_at, load_seconds):
+        self.model = model
+        self.engine = engine
+        self.version = version
+        self.path = path
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+    def info(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": self.loaded_at.isoformat(timespec="seconds"),
+            "load_seconds": round(self.load_seconds, 4),
+            "engine": "flat" if self.engine is not None else "sklearn",
+            "trees": len(getattr(self.model, "estimators_", [])),
+            "classes": self.model.classes_.tolist(),
+        }
+
+
+class ModelStore:
+    # Loads path, and with watch() keeps checking it in a background thread.
+    # When the file changes the new version is loaded and checked on the
+    # canary rows (X, y) first: it must take n_features inputs, return one
+    # probability row summing to 1 per input and reach min_accuracy. Only
+    # then does it replace current, a single reference assignment. A file
+    # that fails to load or validate (say, caught half written) is logged in
+    # last_error and the old model keeps serving until the file changes again.
+    def __init__(self, path, n_features, canary, min_accuracy=0.9, flat_engine=True, on_swap=None):
+        self.path = path
+        self.n_features = n_features
+        self.canary = canary
+        self.min_accuracy = min_accuracy
+        self.flat_engine = flat_engine
+        self.on_swap = on_swap
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_check = None
+        self.lock = threading.Lock()
+        self.stamp = self.file_stamp()
+        self.current = self.load()
+
+    def file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        start = time.perf_counter()
+        with open(self.path, "rb") as f:
+            data = f.read()
+        # Hashing the bytes that are loaded, not the file, keeps the version
+        # right even if the file is replaced again meanwhile
+        version = hashlib.sha256(data).hexdigest()[:12]
+        model = joblib.load(io.BytesIO(data))
+        engine = FlatForest.from_sklearn(model) if self.flat_engine else None
+        self.validate(model, engine)
+        return LoadedModel(model, engine, version, self.path, datetime.now(), time.perf_counter() - start)
+
+    def validate(self, model, engine):
+        X, y = self.canary
+        if getattr(model, "n_features_in_", None) != self.n_features:
+            raise ValueError(f"Model expects {getattr(model, 'n_features_in_', None)} features, not {self.n_features}")
+        probabilities = model.predict_proba(X)
+        if probabilities.shape != (len(X), len(model.classes_)) or not np.isfinite(probabilities).all():
+            raise ValueError(f"Bad probabilities of shape {probabilities.shape}")
+        if not np.allclose(probabilities.sum(axis=1), 1.0):
+            raise ValueError("Probabilities do not sum to 1")
+        accuracy = np.mean(model.classes_.take(np.argmax(probabilities, axis=1)) == y)
+        if accuracy < self.min_accuracy:
+            raise ValueError(f"Canary accuracy {accuracy:.3f} is below {self.min_accuracy}")
+        if engine is not None and not np.array_equal(engine.predict_proba(X), probabilities):
+            raise ValueError("Flat engine disagrees with the model")
+
+    def reload(self, force=False):
+        # Returns True if a new model was swapped in
+        with self.lock:
+            self.last_check = datetime.now()
+            stamp = self.file_stamp()
+            if stamp is None or (stamp == self.stamp and not force):
+                return False
+            self.stamp = stamp
+            try:
+                loaded = self.load()
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{datetime.now().isoformat(timespec='seconds')}: {type(e).__name__}: {e}"
+                return False
+            self.current = loaded
+            self.reloads += 1
+            self.last_error = None
+        if self.on_swap is not None:
+            self.on_swap(loaded)
+        return True
+
+    def watch(self, every=2.0):
+        def run():
+            while True:
+                time.sleep(every)
+                self.reload()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def info(self):
+        return {
+            **self.current.info(),
+            "reloads": self.reloads,
+            "failed_reloads": self.failures,
+            "last_error": self.last_error,
+            "last_check": self.last_check.isoformat(timespec="seconds") if self.last_check else None,
+        }
\ No newline at end of file
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    # LRU cache of predictions for feature vectors on a grid of step quantum
+    # (0.1 matches the 0.1 cm steps of the UI sliders). Rows off the grid
+    # are predicted as they are and never cached, so the cache cannot
+    # change an answer. app.py calls clear() when a new model is swapped in.
+    def __init__(self, predict, max_entries=10000, quantum=0.1):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if quantum <= 0:
+            raise ValueError("quantum must be positive")
+        self.predict_rows = predict
+        self.max_entries = max_entries
+        # Dividing by 10.0 rather than multiplying by 0.1 gives back exactly
+        # the float a client would have sent for 5.1
+        self.scale = 1 / quantum
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            # Predictions still in flight for the old model are not stored
+            self.generation += 1
+            self.invalidations += 1
+
+    def predict(self, X):
+        X = np.asarray(X)
+        if X.dtype.kind != "f":
+            X = X.astype(np.float64)
+        grid = np.round(X.astype(np.float64) * self.scale)
+        # A row is on the grid if snapping gives back the same values in its
+        # own dtype (float32 5.1 is on it too); rows with NaN or infinity
+        # never are
+        on_grid = (grid / self.scale).astype(X.dtype) == X
+        cacheable = (np.isfinite(grid).all(axis=1) & on_grid.all(axis=1)).tolist()
+        keys = [tuple(row) for row in grid.tolist()]
+        results = [None] * len(keys)
+        missing = []
+        with self.lock:
+            generation = self.generation
+            for i, key in enumerate(keys):
+                value = self.entries.get(key) if cacheable[i] else None
+                if value is None:
+                    missing.append(i)
+                else:
+                    self.entries.move_to_end(key)
+                    results[i] = value
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            predicted = self.predict_rows(X[missing])
+            with self.lock:
+                for i, value in zip(missing, predicted):
+                    results[i] = value
+                    if cacheable[i] and generation == self.generation:
+                        self.entries[keys[i]] = value
+                        if len(self.entries) > self.max_entries:
+                            self.entries.popitem(last=False)
+                            self.evictions += 1
+        return np.array(results)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
\ No newline at end of file
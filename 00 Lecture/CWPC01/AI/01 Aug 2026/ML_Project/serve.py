@@ -0,0 +1,210 @@
+import argparse
+import copy
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# Pre-fork serving: the parent imports app.py (loading and validating the
+# model once), freezes the garbage collector, binds the listening socket
+# and forks the workers. Each worker serves that same socket, so the kernel
+# spreads connections over them, and they all read the model from the
+# pages they inherited instead of a copy each. gc.freeze() moves every
+# object the parent made out of the collector's reach, so collections in a
+# worker do not write to (and so copy) those pages.
+#
+# With --mmap the flat engine's arrays are written to a file and each
+# worker maps it read-only, so they live once in the page cache, clean and
+# file-backed, and stay shared even after a hot reload in the parent's
+# copy of the model would otherwise diverge.
+
+def run_worker(sock, args):
+    # The parent's threads (model watcher, micro-batcher) do not survive
+    # fork(), so the worker starts its own.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    import app as app_module
+    from batcher import MicroBatcher
+    from forest_engine import FlatForest
+    from werkzeug.serving import make_server
+
+    if args.mmap:
+        loaded = copy.copy(app_module.store.current)
+        loaded.engine = FlatForest.load(args.mmap, mmap_mode="r")
+        app_module.store.current = loaded
+    if app_module.batcher is not None:
+        app_module.batcher = MicroBatcher(app_module.predict_rows, app_module.BATCH_MAX_ROWS, app_module.BATCH_MAX_WAIT_MS)
+    if app_module.MODEL_WATCH_SECONDS > 0:
+        app_module.store.watch(app_module.MODEL_WATCH_SECONDS)
+    if not args.access_log:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server(args.host, args.port, app_module.app, threaded=args.threads, fd=sock.fileno())
+    server.serve_forever()
+
+
+def fork_worker(sock, args):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock, args)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def serve(args):
+    # The model watcher thread is started in each worker instead
+    watch_seconds = os.environ.get("MODEL_WATCH_SECONDS", "2")
+    os.environ["MODEL_WATCH_SECONDS"] = "0"
+    sys.path.insert(0, HERE)
+    import app as app_module
+    app_module.MODEL_WATCH_SECONDS = float(watch_seconds)
+
+    if args.mmap:
+        from forest_engine import FlatForest
+        FlatForest.from_sklearn(app_module.store.current.model).save(args.mmap)
+        # Workers map the file instead; no heap copy to inherit
+        app_module.store.current.engine = None
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    print(f"Listening on {args.host}:{sock.getsockname()[1]}", flush=True)
+    gc.collect()
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        workers.add(fork_worker(sock, args))
+    print("Workers " + " ".join(str(pid) for pid in sorted(workers)), flush=True)
+
+    # Replace workers that die until asked to stop
+    while workers:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            workers.add(fork_worker(sock, args))
+    sock.close()
+
+
+def memory_kb(pid):
+    # Rss counts every resident page, shared or not; Pss splits each shared
+    # page between the processes mapping it, so Pss adds up across workers
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def client(url, rows, seconds, result):
+    # One load-generating process: posts rows to /predict for seconds
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        row = rows[count % len(rows)]
+        body = json.dumps({"sepal_length": row[0], "sepal_width": row[1], "petal_length": row[2], "petal_width": row[3]})
+        req = urllib.request.Request(url + "/predict", data=body.encode(), headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req) as response:
+            response.read()
+        count += 1
+    result.put(count)
+
+
+def measure(args, workers):
+    command = [sys.executable, "-W", "ignore", os.path.join(HERE, "serve.py"), "--workers", str(workers), "--port", "0"]
+    if args.mmap:
+        command += ["--mmap", args.mmap]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=HERE)
+    try:
+        port = int(server.stdout.readline().rsplit(":", 1)[1])
+        pids = [int(pid) for pid in server.stdout.readline().split()[1:]]
+        url = f"http://127.0.0.1:{port}"
+        rng = np.random.default_rng(0)
+        rows = np.round(rng.uniform([4.3, 2.0, 1.0, 0.1], [7.9, 4.4, 6.9, 2.5], (1000, 4)), 2).tolist()
+        # Warm every worker up before measuring
+        for _ in range(workers * 4):
+            urllib.request.urlopen(url + "/model").read()
+        result = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client, args=(url, rows[i::args.clients], args.seconds, result))
+                   for i in range(args.clients)]
+        for process in clients:
+            process.start()
+        requests = sum(result.get() for _ in clients)
+        for process in clients:
+            process.join()
+        usage = [memory_kb(pid) for pid in pids]
+        parent = memory_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "workers": workers,
+        "requests_per_second": requests / args.seconds,
+        "parent_rss_mb": parent["Rss"] / 1024,
+        "worker_rss_mb": sum(u["Rss"] for u in usage) / len(usage) / 1024,
+        "worker_pss_mb": sum(u["Pss"] for u in usage) / len(usage) / 1024,
+        "worker_private_mb": sum(u["Private_Clean"] + u["Private_Dirty"] for u in usage) / len(usage) / 1024,
+        "total_pss_mb": (parent["Pss"] + sum(u["Pss"] for u in usage)) / 1024,
+    }
+
+
+def report(args):
+    print(f"{'workers':>7} {'req/s':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'private/worker':>15} {'total PSS':>10}")
+    for workers in args.report:
+        row = measure(args, workers)
+        print(f"{workers:>7} {row['requests_per_second']:>8,.0f} {row['worker_rss_mb']:>9.1f}MB {row['worker_pss_mb']:>9.1f}MB "
+              f"{row['worker_private_mb']:>13.1f}MB {row['total_pss_mb']:>8.1f}MB")
+
+
+def int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve app.py from pre-forked workers sharing one copy of the model")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000, help="0 picks a free port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", action="store_true", help="a thread per request inside each worker")
+    parser.add_argument("--mmap", help="write the flat engine here and have workers memory-map it")
+    parser.add_argument("--access-log", action="store_true")
+    parser.add_argument("--report", type=int_list, help="measure memory and throughput for these worker counts, e.g. 1,2,4,8,16")
+    parser.add_argument("--clients", type=int, default=16, help="load processes for --report")
+    parser.add_argument("--seconds", type=float, default=5.0, help="load duration per worker count for --report")
+    args = parser.parse_args()
+    if args.report:
+        report(args)
+    else:
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_ticket_system():
+    # The ticket system lives in a script whose file name has spaces, so it
+    # is loaded by path instead of with a plain import.
+    spec = importlib.util.spec_from_file_location(
+        "movie_ticket_management_system", os.path.join(HERE, "movie ticket management system.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+mts = load_ticket_system()
+
+
+# The protocol is one JSON object per line each way. A request names an op
+# plus its fields, e.g. {"id": 7, "op": "book", "theater": "Odeon",
+# "movie": "Dune", "show_time": "2025-01-01T19:00", "tickets": 2}, and the
+# reply is {"id": 7, "ok": true, "result": ...} or {"id": 7, "ok": false,
+# "error": "..."}. Replies come back in request order on each connection.
+
+def find_theater(ticket_system, theater_name):
+    theater = ticket_system.get_theater(theater_name)
+    if theater is None:
+        raise ValueError(f"Theater not found: {theater_name}")
+    return theater
+
+
+def find_movie(theater, title):
+    movie = theater.get_movie(title)
+    if movie is None:
+        raise ValueError(f"Movie not found: {title}")
+    return movie
+
+
+def op_book(ticket_system, request):
+    theater = find_theater(ticket_system, request["theater"])
+    booking = theater.book_ticket(find_movie(theater, request["movie"]), datetime.fromisoformat(request["show_time"]),
+                                  request["tickets"], request.get("contiguous", False), "fail", request.get("customer"))
+    return {"booking_id": booking.booking_id, "seats": booking.seats}
+
+
+def op_book_many(ticket_system, request):
+    lines = [
+        (line["theater"], line["movie"], datetime.fromisoformat(line["show_time"]), line["tickets"],
+         line.get("contiguous", False), line.get("customer"))
+        for line in request["lines"]
+    ]
+    return [
+        {"booking_id": result.booking_id, "seats": result.seats} if ok else {"error": result}
+        for ok, result in ticket_system.book_many(lines, request.get("atomic", False))
+    ]
+
+
+def op_cancel(ticket_system, request):
+    return ticket_system.cancel_booking(request["booking_id"]).seats
+
+
+def op_booking(ticket_system, request):
+    booking = ticket_system.get_booking(request["booking_id"])
+    if booking is None:
+        raise ValueError(f"Unknown booking: #{request['booking_id']}")
+    return booking.to_data()
+
+
+def op_free_seats(ticket_system, request):
+    theater = find_theater(ticket_system, request["theater"])
+    return theater.get_seat_map(datetime.fromisoformat(request["show_time"])).free_count
+
+
+def op_find_shows(ticket_system, request):
+    shows = ticket_system.find_shows(datetime.fromisoformat(request["start"]), datetime.fromisoformat(request["end"]),
+                                     request.get("seats", 1), request.get("contiguous", False))
+    return [
+        {"theater": theater.name, "movie": movie.title, "show_time": show_time.isoformat(),
+         "free": free_count, "longest_run": longest_run}
+        for theater, movie, show_time, free_count, longest_run in shows
+    ]
+
+
+def op_metrics(ticket_system, request):
+    return ticket_system.metrics.snapshot(ticket_system)
+
+
+OPS = {
+    "book": op_book,
+    "book_many": op_book_many,
+    "cancel": op_cancel,
+    "booking": op_booking,
+    "free_seats": op_free_seats,
+    "find_shows": op_find_shows,
+    "metrics": op_metrics,
+}
+
+# Ops whose reply must wait until their journal records are committed.
+WRITE_OPS = {"book", "book_many", "cancel"}
+
+
+class TicketServer:
+    # Every connection is served on one event loop and every request runs
+    # to completion before the next, so the ticket system needs no locks.
+    # A connection may send many requests without waiting for replies:
+    # whatever has arrived is executed in order and answered in one write.
+    # Replies to writes are held until the next group commit, which makes
+    # all journal records appended since the last commit durable at once.
+    def __init__(self, ticket_system):
+        self.ticket_system = ticket_system
+        self.commit_waiters = []
+        self.commit_requested = None
+        self.committer = None
+        self.server = None
+        self.commits = 0
+
+    async def start(self, host, port):
+        self.commit_requested = asyncio.Event()
+        self.committer = asyncio.create_task(self.commit_loop())
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.committer.cancel()
+        self.ticket_system.commit_journal()
+
+    async def commit_loop(self):
+        while True:
+            await self.commit_requested.wait()
+            # One more pass through the loop lets every connection whose
+            # input is already waiting append its records to this commit.
+            await asyncio.sleep(0)
+            self.commit_requested.clear()
+            waiters, self.commit_waiters = self.commit_waiters, []
+            self.ticket_system.commit_journal()
+            self.commits += 1
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def committed(self):
+        waiter = asyncio.get_running_loop().create_future()
+        self.commit_waiters.append(waiter)
+        self.commit_requested.set()
+        return waiter
+
+    def execute(self, line):
+        # Returns the encoded reply and whether the request changed anything.
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            op = OPS.get(request.get("op"))
+            if op is None:
+                raise ValueError(f"Unknown op: {request.get('op')}")
+            reply = {"id": request_id, "ok": True, "result": op(self.ticket_system, request)}
+            wrote = request["op"] in WRITE_OPS
+        except (ValueError, TypeError, AttributeError) as e:
+            reply, wrote = {"id": request_id, "ok": False, "error": str(e)}, False
+        except KeyError as e:
+            reply, wrote = {"id": request_id, "ok": False, "error": f"Missing field: {e}"}, False
+        return json.dumps(reply, separators=(",", ":")).encode() + b"\n", wrote
+
+    async def handle(self, reader, writer):
+        buffer = b""
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                *lines, buffer = (buffer + data).split(b"\n")
+                if len(buffer) > 1 << 20:
+                    break
+                replies = []
+                wrote = False
+                for line in lines:
+                    if line.strip():
+                        reply, changed = self.execute(line)
+                        replies.append(reply)
+                        wrote = wrote or changed
+                if not replies:
+                    continue
+                if wrote and self.ticket_system.journal:
+                    await self.committed()
+                writer.write(b"".join(replies))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def populate(ticket_system, num_theaters, shows_per_theater, capacity):
+    start = datetime(2025, 1, 1, 10, 0)
+    for t in range(num_theaters):
+        theater = mts.Theater(f"Theater {t}", capacity)
+        movie = mts.Movie(f"Movie {t}", 120, "PG")
+        for s in range(shows_per_theater):
+            movie.add_show_time(start + timedelta(hours=3 * s))
+        theater.add_movie(movie)
+        ticket_system.add_theater(theater)
+
+
+def raise_file_limit():
+    # Thousands of sockets need more descriptors than the usual soft limit.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def serve(args, ready=None):
+    raise_file_limit()
+    ticket_system = mts.TicketSystem()
+    if args.data:
+        try:
+            ticket_system.load_from_file(args.data)
+        except FileNotFoundError:
+            pass
+        ticket_system.open_journal(args.data, args.snapshot_every, args.sync, group_commit=True)
+    if not ticket_system.theaters:
+        # Opened first, the journal records the demo theaters too.
+        populate(ticket_system, args.theaters, args.shows, args.capacity)
+        ticket_system.commit_journal()
+
+    async def run():
+        server = TicketServer(ticket_system)
+        port = await server.start(args.host, args.port)
+        if ready is not None:
+            ready.send(port)
+        else:
+            print(f"Serving {len(ticket_system.theaters)} theaters on {args.host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.data:
+            ticket_system.save_to_file(args.data)
+            ticket_system.close_journal()
+
+
+async def load_connection(reader, writer, num_requests, pipeline, theaters, shows, rng, latencies, errors):
+    # Keeps up to pipeline requests in flight: a slot is taken before each
+    # send and given back by the reader as each reply arrives.
+    sent_at = deque()
+    window = asyncio.Semaphore(pipeline)
+
+    async def receive():
+        for _ in range(num_requests):
+            line = await reader.readline()
+            latencies.record(time.perf_counter_ns() - sent_at.popleft())
+            if not json.loads(line)["ok"]:
+                errors[0] += 1
+            window.release()
+
+    receiver = asyncio.create_task(receive())
+    first_show = datetime(2025, 1, 1, 10, 0)
+    for i in range(num_requests):
+        await window.acquire()
+        t = rng.randrange(theaters)
+        request = {"id": i, "theater": f"Theater {t}",
+                   "show_time": (first_show + timedelta(hours=3 * rng.randrange(shows))).isoformat()}
+        if rng.random() < 0.8:
+            request.update(op="book", movie=f"Movie {t}", tickets=rng.randint(1, 4))
+        else:
+            request["op"] = "free_seats"
+        sent_at.append(time.perf_counter_ns())
+        writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    await receiver
+    writer.close()
+
+
+async def run_load(args, port):
+    # Connections are opened in waves so the listen backlog never overflows,
+    # then all of them start sending at once.
+    streams = []
+    for first in range(0, args.connections, 1000):
+        wave = min(1000, args.connections - first)
+        streams += await asyncio.gather(*(asyncio.open_connection(args.host, port) for _ in range(wave)))
+    latencies = mts.LatencyHistogram()
+    errors = [0]
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        load_connection(reader, writer, args.requests, args.pipeline, args.theaters, args.shows,
+                        random.Random(rng.getrandbits(32)), latencies, errors)
+        for reader, writer in streams
+    ))
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio front end and load client for the ticket system")
+    parser.add_argument("mode", choices=("serve", "load"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--data", help="JSON or SQLite file to load from and journal to")
+    parser.add_argument("--snapshot-every", type=int, default=10_000)
+    parser.add_argument("--sync", action="store_true", help="fsync every group commit")
+    parser.add_argument("--theaters", type=int, default=100)
+    parser.add_argument("--shows", type=int, default=10)
+    parser.add_argument("--capacity", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=10, help="requests per connection")
+    parser.add_argument("--pipeline", type=int, default=4, help="requests in flight per connection")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        serve(args)
+        return
+
+    # The load client starts its own server in a child process on a free
+    # port, so client and server each get their own event loop.
+    raise_file_limit()
+    args.port = 0
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args, child_conn), daemon=True)
+    server.start()
+    port = parent_conn.recv()
+    try:
+        latencies, errors, elapsed = asyncio.run(run_load(args, port))
+    finally:
+        server.terminate()
+        server.join()
+    total = latencies.count
+    print(f"{args.connections:,} connections x {args.requests} requests, pipeline depth {args.pipeline}")
+    print(f"  {total:,} requests in {elapsed:.2f} s ({total / elapsed:,.0f}/s), {errors:,} refused")
+    for q in (50, 99, 99.9):
+        print(f"  p{q:<4} {latencies.percentile(q) / 1e6:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,680 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_ticket_system():
+    # The ticket system lives in a script whose file name has spaces, so it
+    # is loaded by path instead of with a plain import.
+    spec = importlib.util.spec_from_file_location(
+        "movie_ticket_management_system", os.path.join(HERE, "movie ticket management system.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+mts = load_ticket_system()
+
+
+def build_system(num_theaters, shows_per_theater, capacity, concurrent=False):
+    ticket_system = mts.TicketSystem(concurrent)
+    start = datetime(2025, 1, 1, 10, 0)
+    for t in range(num_theaters):
+        theater = mts.Theater(f"Theater {t}", capacity)
+        movie = mts.Movie(f"Movie {t}", 120, "PG")
+        for s in range(shows_per_theater):
+            movie.add_show_time(start + timedelta(hours=3 * s))
+        theater.add_movie(movie)
+        ticket_system.add_theater(theater)
+    return ticket_system
+
+
+def random_bookings(ticket_system, count, rng, max_group=4):
+    theaters = ticket_system.theaters
+    for _ in range(count):
+        theater = rng.choice(theaters)
+        movie = rng.choice(theater.movies)
+        yield theater, movie, rng.choice(movie.show_times), rng.randint(1, max_group)
+
+
+def list_book(seats, num_tickets):
+    # The original list-of-booleans booking, kept here as the baseline.
+    available_seats = seats.count(True)
+    if available_seats < num_tickets:
+        raise ValueError(f"Not enough seats available. Only {available_seats} seats left.")
+    booked_seats = []
+    for i, seat in enumerate(seats):
+        if seat and len(booked_seats) < num_tickets:
+            seats[i] = False
+            booked_seats.append(i + 1)
+    return booked_seats
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    shows = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del shows
+    return size
+
+
+def bench_seat_maps(args):
+    capacity, num_shows = args.capacity, args.shows
+    list_bytes = measure_memory(lambda: [[True] * capacity for _ in range(num_shows)])
+    seat_map_bytes = measure_memory(lambda: [mts.SeatMap(capacity) for _ in range(num_shows)])
+    print(f"Memory for {num_shows} shows x {capacity} seats:")
+    print(f"  list of bools: {list_bytes / 1e6:8.2f} MB")
+    print(f"  SeatMap:       {seat_map_bytes / 1e6:8.2f} MB")
+
+    rng = random.Random(args.seed)
+    groups = [rng.randint(1, 6) for _ in range(capacity)]
+    show_count = max(1, num_shows // 10)
+
+    def sell_out(book, seats):
+        bookings = 0
+        for group in groups:
+            try:
+                book(seats, group)
+            except ValueError:
+                break
+            bookings += 1
+        return bookings
+
+    start = time.perf_counter()
+    list_bookings = sum(sell_out(list_book, [True] * capacity) for _ in range(show_count))
+    list_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    seat_map_bookings = sum(sell_out(mts.SeatMap.allocate, mts.SeatMap(capacity)) for _ in range(show_count))
+    seat_map_time = time.perf_counter() - start
+
+    print(f"Selling out {show_count} shows in groups of 1-6:")
+    print(f"  list of bools: {list_bookings / list_time:12,.0f} bookings/s")
+    print(f"  SeatMap:       {seat_map_bookings / seat_map_time:12,.0f} bookings/s")
+
+
+def bench_journal(args):
+    ticket_system = build_system(args.theaters, args.shows // args.theaters or 1, args.capacity)
+    rng = random.Random(args.seed)
+    bookings = list(random_bookings(ticket_system, 200, rng))
+    workdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(workdir, "ticket_system_data.json")
+
+        start = time.perf_counter()
+        for theater, movie, show_time, num_tickets in bookings[:20]:
+            theater.book_ticket(movie, show_time, num_tickets)
+            ticket_system.save_to_file(filename)
+        full_save = (time.perf_counter() - start) / 20
+
+        ticket_system.open_journal(filename, snapshot_every=10 ** 9)
+        start = time.perf_counter()
+        for theater, movie, show_time, num_tickets in bookings[20:]:
+            theater.book_ticket(movie, show_time, num_tickets)
+        journaled = (time.perf_counter() - start) / (len(bookings) - 20)
+        ticket_system.close_journal()
+
+        start = time.perf_counter()
+        mts.TicketSystem().load_from_file(filename)
+        recovery = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir)
+
+    total_seats = sum(len(seats) for t in ticket_system.theaters for seats in t.seats.values())
+    print(f"Booking + save with {total_seats:,} seats on file:")
+    print(f"  full JSON rewrite: {full_save * 1e3:10.3f} ms/booking")
+    print(f"  journal append:    {journaled * 1e3:10.3f} ms/booking")
+    print(f"Snapshot + {len(bookings) - 20} journal records replayed in {recovery * 1e3:.1f} ms")
+
+
+def scan_for_run(seats, num_seats):
+    # Baseline: walk the seat list looking for num_seats free seats in a row.
+    run = 0
+    for i, seat in enumerate(seats):
+        run = run + 1 if seat else 0
+        if run == num_seats:
+            return i - num_seats + 2
+    return 0
+
+
+def bench_contiguous(args):
+    rng = random.Random(args.seed)
+    capacity = args.capacity
+    # Fragment the hall: short free runs of 1-4 seats separated by sold
+    # seats, so groups of 5 or more only fit in the few long runs left.
+    seat_map = mts.SeatMap(capacity)
+    sold = []
+    seat = rng.randint(1, 4)
+    while seat <= capacity:
+        if rng.random() < 0.99:
+            sold.append(seat)
+        seat += rng.randint(2, 5)
+    seat_map.claim(sold)
+    groups = [rng.randint(5, 8) for _ in range(200)]
+
+    seats = seat_map.to_list()
+    start = time.perf_counter()
+    scanned = 0
+    for group in groups:
+        first = scan_for_run(seats, group)
+        if first:
+            seats[first - 1:first - 1 + group] = [False] * group
+            scanned += 1
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    seat_map.run_tree()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    placed = 0
+    for group in groups:
+        try:
+            seat_map.allocate_contiguous(group)
+            placed += 1
+        except ValueError:
+            pass
+    tree_time = time.perf_counter() - start
+
+    assert placed == scanned and seat_map.to_list() == seats
+    print(f"Seating {len(groups)} groups of 5-8 together in a fragmented {capacity}-seat hall ({placed} placed):")
+    print(f"  linear scan:  {scan_time / len(groups) * 1e6:10.1f} us/group")
+    print(f"  segment tree: {tree_time / len(groups) * 1e6:10.1f} us/group (+{build_time * 1e3:.1f} ms one-off build)")
+
+
+def bench_storage(args):
+    # Bookings per second including persistence: a full JSON rewrite per
+    # booking (the original save path), the JSON journal, and SQLite with
+    # batched commits.
+    rng = random.Random(args.seed)
+    num_bookings = 20_000
+    workdir = tempfile.mkdtemp()
+    try:
+        print(f"{'backend':<34} {'bookings/s':>12}")
+        ticket_system = build_system(args.theaters, args.shows // args.theaters or 1, args.capacity)
+        filename = os.path.join(workdir, "full.json")
+        bookings = list(random_bookings(ticket_system, 10, rng))
+        start = time.perf_counter()
+        for theater, movie, show_time, num_tickets in bookings:
+            theater.book_ticket(movie, show_time, num_tickets)
+            ticket_system.save_to_file(filename)
+        print(f"{'JSON full rewrite per booking':<34} {len(bookings) / (time.perf_counter() - start):>12,.1f}")
+
+        backends = [
+            ("JSON journal, snapshot every 1000", "journal.json", {"snapshot_every": 1000}),
+            ("SQLite WAL, commit every 1", "commit1.db", {"snapshot_every": 1}),
+            ("SQLite WAL, commit every 100", "commit100.db", {"snapshot_every": 100}),
+            ("SQLite WAL, commit every 1000", "commit1000.db", {"snapshot_every": 1000}),
+        ]
+        for label, name, options in backends:
+            ticket_system = build_system(args.theaters, args.shows // args.theaters or 1, args.capacity)
+            filename = os.path.join(workdir, name)
+            ticket_system.save_to_file(filename)
+            ticket_system.open_journal(filename, **options)
+            bookings = list(random_bookings(ticket_system, num_bookings, rng))
+            start = time.perf_counter()
+            for theater, movie, show_time, num_tickets in bookings:
+                try:
+                    theater.book_ticket(movie, show_time, num_tickets)
+                except ValueError:
+                    pass
+            ticket_system.close_journal()
+            elapsed = time.perf_counter() - start
+            reloaded = mts.TicketSystem()
+            reloaded.load_from_file(filename)
+            assert len(reloaded.bookings) == len(ticket_system.bookings)
+            print(f"{label:<34} {len(bookings) / elapsed:>12,.1f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+def legacy_load(filename):
+    # The original loader: json.load the whole file, then build a list of
+    # booleans for every show up front.
+    with open(filename, 'r') as f:
+        data = json.load(f)
+    theaters = []
+    for theater_data in data["theaters"]:
+        theater = mts.Theater(theater_data["name"], theater_data["capacity"])
+        for movie_data in theater_data["movies"]:
+            movie = mts.Movie(movie_data["title"], movie_data["duration"], movie_data["rating"])
+            movie.show_times = [datetime.fromisoformat(st) for st in movie_data["show_times"]]
+            theater.movies.append(movie)
+        theater.seats = {datetime.fromisoformat(st): seats for st, seats in theater_data["seats"].items()}
+        theaters.append(theater)
+    return theaters
+
+
+def load_child(mode, filename):
+    # Runs in a fresh interpreter so ru_maxrss is the peak of this load only.
+    start = time.perf_counter()
+    if mode == "legacy":
+        legacy_load(filename)
+    elif mode != "baseline":
+        mts.TicketSystem().load_from_file(filename, lazy=(mode == "lazy"))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "peak_mb": peak_rss_kb() / 1024}))
+
+
+def peak_rss_kb():
+    # Linux carries ru_maxrss over from the forking parent, so prefer this
+    # process's own high-water mark when /proc has it.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_loading(args):
+    ticket_system = build_system(args.theaters, args.shows // args.theaters or 1, args.capacity)
+    rng = random.Random(args.seed)
+    for theater, movie, show_time, num_tickets in random_bookings(ticket_system, args.shows * 5, rng):
+        try:
+            theater.book_ticket(movie, show_time, num_tickets)
+        except ValueError:
+            pass
+    workdir = tempfile.mkdtemp()
+    try:
+        list_file = os.path.join(workdir, "list.json")
+        binary_file = os.path.join(workdir, "binary.json")
+        ticket_system.save_to_file(list_file)
+        ticket_system.seat_format = "binary"
+        ticket_system.save_to_file(binary_file)
+        print(f"{args.shows} shows x {args.capacity} seats: list file {os.path.getsize(list_file) / 1e6:.1f} MB, "
+              f"binary file {os.path.getsize(binary_file) / 1e6:.1f} MB")
+        runs = [
+            ("interpreter only", "baseline", list_file),
+            ("json.load + lists (original)", "legacy", list_file),
+            ("streaming, list seats", "eager", list_file),
+            ("streaming, binary seats, eager", "eager", binary_file),
+            ("streaming, binary seats, lazy", "lazy", binary_file),
+        ]
+        print(f"{'loader':<32} {'seconds':>8} {'peak RSS MB':>12}")
+        for label, mode, filename in runs:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--load-child", mode, filename],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            print(f"{label:<32} {result['seconds']:>8.3f} {result['peak_mb']:>12.1f}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+def bench_bookings(args):
+    # Cancelling by booking ID should cost the same however many theaters
+    # and bookings exist. The baseline finds the booking by scanning a flat
+    # list, which is what "cancel booking #123" costs without an index.
+    rng = random.Random(args.seed)
+    print(f"{'theaters':>9} {'bookings':>9} {'scan us':>9} {'by ID us':>9}")
+    for num_theaters in (10, 100, 1000):
+        ticket_system = build_system(num_theaters, 4, 200)
+        bookings = []
+        for theater, movie, show_time, num_tickets in random_bookings(ticket_system, num_theaters * 100, rng):
+            try:
+                bookings.append(theater.book_ticket(movie, show_time, num_tickets, customer=f"c{rng.randrange(1000)}"))
+            except ValueError:
+                pass
+        flat = [(booking.booking_id, booking) for booking in bookings]
+        victims = rng.sample(bookings, 200)
+
+        start = time.perf_counter()
+        for victim in victims:
+            next(booking for booking_id, booking in flat if booking_id == victim.booking_id)
+        scan_time = (time.perf_counter() - start) / len(victims)
+
+        start = time.perf_counter()
+        for victim in victims:
+            ticket_system.cancel_booking(victim.booking_id)
+        cancel_time = (time.perf_counter() - start) / len(victims)
+
+        for victim in victims:
+            theater = ticket_system.get_theater(victim.theater_name)
+            seat_map = theater.get_seat_map(victim.show_time)
+            assert ticket_system.get_booking(victim.booking_id) is None
+            assert all(seat_map.is_free(seat) for seat in victim.seats)
+        assert len(ticket_system.bookings) == len(bookings) - len(victims)
+        print(f"{num_theaters:>9} {len(bookings):>9} {scan_time * 1e6:>9.1f} {cancel_time * 1e6:>9.1f}")
+
+
+def bench_holds(args):
+    # Simulated clock: 100k holds arrive over ten minutes, each for five
+    # minutes; 30% are paid for before they expire and the rest time out.
+    num_holds, ttl, arrival_seconds = args.holds, 300, 600
+    clock = [0.0]
+    ticket_system = build_system(args.theaters, 4, 2 * num_holds // (args.theaters * 4) + 10)
+    ticket_system.holds = mts.HoldWheel(clock=lambda: clock[0])
+    for theater in ticket_system.theaters:
+        theater.holds = ticket_system.holds
+    rng = random.Random(args.seed)
+    shows = [(t, m, st) for t in ticket_system.theaters for m in t.movies for st in m.show_times]
+    per_second = num_holds // arrival_seconds
+    payments = {}
+    naive_active = {}
+    hold_time = book_time = expire_time = naive_time = 0.0
+    sold = expired = 0
+
+    for second in range(arrival_seconds + ttl + 2):
+        clock[0] = float(second)
+        start = time.perf_counter()
+        expired += len(ticket_system.expire_holds())
+        expire_time += time.perf_counter() - start
+
+        # The naive alternative: scan every live hold once a second.
+        start = time.perf_counter()
+        for hold_id in [h for h, expires_at in naive_active.items() if expires_at <= clock[0]]:
+            del naive_active[hold_id]
+        naive_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for hold in payments.pop(second, ()):
+            hold.theater.book_ticket(None, None, 0, hold_id=hold.hold_id)
+            naive_active.pop(hold.hold_id, None)
+            sold += 1
+        book_time += time.perf_counter() - start
+
+        if second < arrival_seconds:
+            start = time.perf_counter()
+            for _ in range(per_second):
+                theater, movie, show_time = rng.choice(shows)
+                hold = theater.hold_seats(movie, show_time, 2, ttl=ttl)
+                if rng.random() < 0.3:
+                    payments.setdefault(second + rng.randint(1, ttl - 1), []).append(hold)
+                naive_active[hold.hold_id] = clock[0] + ttl
+            hold_time += time.perf_counter() - start
+
+    total = per_second * arrival_seconds
+    assert len(ticket_system.holds) == 0 and sold + expired == total
+    held = sum(t.get_seat_map(st).held_bits.bit_count() for t, _, st in shows)
+    booked = sum(t.capacity - t.get_seat_map(st).free_count for t, _, st in shows)
+    assert held == 0 and booked == 2 * sold
+    print(f"{total:,} holds: {sold:,} sold, {expired:,} expired")
+    print(f"  place hold:        {hold_time / total * 1e6:8.2f} us/hold")
+    print(f"  hold -> sale:      {book_time / max(sold, 1) * 1e6:8.2f} us/sale")
+    print(f"  timing wheel:      {expire_time / total * 1e6:8.2f} us/hold expiry work")
+    print(f"  scan every second: {naive_time / total * 1e6:8.2f} us/hold expiry work")
+
+
+def bench_availability(args):
+    # Every show is sold at random to between half and 15/16 full, so free
+    # counts and longest runs differ, then "which shows in this window have
+    # 4 seats together?" is answered by walking every theater's seats and
+    # by the index.
+    rng = random.Random(args.seed)
+    ticket_system = build_system(args.theaters, args.shows, args.capacity)
+    num_shows = args.theaters * args.shows
+    for theater in ticket_system.theaters:
+        for show_time in theater.seats:
+            free_bits = rng.getrandbits(theater.capacity)
+            for _ in range(rng.randint(0, 3)):
+                free_bits &= rng.getrandbits(theater.capacity)
+            theater.seats[show_time] = mts.SeatMap(theater.capacity, free_bits)
+
+    def walk(start, end, num_seats):
+        found = []
+        for theater in ticket_system.theaters:
+            for show_time, seat_map in theater.seats.items():
+                if start <= show_time < end and seat_map.longest_run() >= num_seats:
+                    found.append((theater.name, show_time))
+        return sorted(found)
+
+    start = time.perf_counter()
+    ticket_system.availability_index()
+    build_time = time.perf_counter() - start
+
+    first = datetime(2025, 1, 1, 10, 0)
+    windows = [("one evening", timedelta(hours=6)), ("one week", timedelta(days=7)), ("every show", timedelta(hours=3 * args.shows))]
+    print(f"{num_shows:,} shows, index built in {build_time:.2f} s")
+    print(f"{'window':>12} {'matches':>8} {'walk ms':>9} {'index ms':>9}")
+    for label, length in windows:
+        window_start = first + timedelta(hours=3 * rng.randrange(max(1, args.shows - length // timedelta(hours=3))))
+        if label == "every show":
+            window_start = first
+        start = time.perf_counter()
+        walked = walk(window_start, window_start + length, 4)
+        walk_time = time.perf_counter() - start
+        start = time.perf_counter()
+        found = ticket_system.find_shows(window_start, window_start + length, 4, contiguous=True)
+        index_time = time.perf_counter() - start
+        assert sorted((theater.name, show_time) for theater, _, show_time, _, _ in found) == walked
+        print(f"{label:>12} {len(found):>8,} {walk_time * 1e3:>9.1f} {index_time * 1e3:>9.2f}")
+
+    # Keeping the index current is part of every booking and cancellation.
+    requests = list(random_bookings(ticket_system, 20_000, rng))
+    for label, indexed in (("without index", False), ("with index", True)):
+        for theater in ticket_system.theaters:
+            theater.availability = ticket_system.availability if indexed else None
+        start = time.perf_counter()
+        bookings = []
+        for theater, movie, show_time, num_tickets in requests:
+            try:
+                bookings.append(theater.book_ticket(movie, show_time, num_tickets))
+            except ValueError:
+                pass
+        for booking in bookings:
+            ticket_system.cancel_booking(booking.booking_id)
+        elapsed = time.perf_counter() - start
+        print(f"  book + cancel {label}: {elapsed / len(requests) * 1e6:6.2f} us/request")
+    assert walk(first, first + timedelta(days=1), 4) == sorted(
+        (theater.name, show_time) for theater, _, show_time, _, _ in ticket_system.find_shows(first, first + timedelta(days=1), 4, True)
+    )
+
+
+def bench_metrics(args):
+    # Metrics wrap methods only while enabled, so with metrics off
+    # theater.book_ticket is the class method itself. Each mode books and
+    # undoes the same requests; the best of three rounds is reported.
+    rng = random.Random(args.seed)
+    ticket_system = build_system(args.theaters, 4, args.capacity)
+    requests = list(random_bookings(ticket_system, 50_000, rng))
+
+    def book_and_undo(direct):
+        start = time.perf_counter()
+        for theater, movie, show_time, num_tickets in requests:
+            if direct:
+                booking = mts.Theater.book_ticket(theater, movie, show_time, num_tickets)
+            else:
+                booking = theater.book_ticket(movie, show_time, num_tickets)
+            theater.get_seat_map(show_time).release(booking.seats)
+            ticket_system.bookings.remove(booking.booking_id)
+        return time.perf_counter() - start
+
+    print(f"book_ticket, best of 3 x {len(requests):,} calls:")
+    for label, enabled, direct in (("class method", False, True), ("disabled", False, False), ("enabled", True, False)):
+        ticket_system.metrics.set_enabled(enabled)
+        elapsed = min(book_and_undo(direct) for _ in range(3))
+        print(f"  {label:>12}: {elapsed / len(requests) * 1e6:6.2f} us/call")
+    ticket_system.metrics.disable()
+    assert all("book_ticket" not in vars(theater) for theater in ticket_system.theaters)
+
+    ticket_system.metrics.reset()
+    ticket_system.metrics.enable()
+    bookings = []
+    for theater, movie, show_time, num_tickets in random_bookings(ticket_system, 50_000, rng):
+        try:
+            bookings.append(theater.book_ticket(movie, show_time, num_tickets))
+        except ValueError:
+            pass
+    for booking in bookings[::2]:
+        ticket_system.cancel_booking(booking.booking_id)
+    snapshot = ticket_system.metrics.snapshot(ticket_system)
+    for op, stats in snapshot["operations"].items():
+        percentiles = "  ".join(f"p{q}={nanos / 1e3:.1f}us" for q, nanos in stats["percentiles_ns"].items())
+        print(f"  {op}: {stats['count']:,} calls  {percentiles}")
+    print(f"  sizes: {snapshot['sizes']}")
+
+
+def bench_batch(args):
+    # Agency orders: batches of 500 lines over a handful of shows, booked
+    # one book_ticket call per line and with book_many.
+    rng = random.Random(args.seed)
+    batches = []
+    for _ in range(40):
+        shows = [(t, datetime(2025, 1, 1, 10, 0) + timedelta(hours=3 * rng.randrange(4)))
+                 for t in rng.sample(range(args.theaters), 10)]
+        batch = []
+        for _ in range(500):
+            t, show_time = rng.choice(shows)
+            batch.append((f"Theater {t}", f"Movie {t}", show_time, rng.randint(1, 6)))
+        batches.append(batch)
+    num_lines = sum(len(batch) for batch in batches)
+
+    def book_lines(ticket_system):
+        results = []
+        for batch in batches:
+            for theater_name, title, show_time, num_tickets in batch:
+                theater = ticket_system.get_theater(theater_name)
+                try:
+                    results.append(theater.book_ticket(theater.get_movie(title), show_time, num_tickets).seats)
+                except ValueError:
+                    results.append(None)
+        return results
+
+    def book_batches(ticket_system, atomic):
+        results = []
+        for batch in batches:
+            results.extend(booking.seats if ok else None for ok, booking in ticket_system.book_many(batch, atomic))
+        return results
+
+    print(f"{num_lines:,} lines in batches of 500, best of 3:")
+    expected = None
+    for label, run in (("book_ticket per line", book_lines),
+                       ("book_many best-effort", lambda ts: book_batches(ts, False)),
+                       ("book_many all-or-none", lambda ts: book_batches(ts, True))):
+        best = None
+        for _ in range(3):
+            ticket_system = build_system(args.theaters, 4, args.capacity, concurrent=True)
+            start = time.perf_counter()
+            results = run(ticket_system)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if expected is None:
+            expected = results
+        elif "best-effort" in label:
+            assert results == expected
+        print(f"  {label:<22} {best / num_lines * 1e6:6.2f} us/line")
+
+
+def stress_bookings(ticket_system, num_threads, seed):
+    # Every thread books random groups, some by count and some by explicit
+    # seat numbers, until every show is sold out. The attempt cap only
+    # matters without locks, where corrupted free counts never reach zero.
+    shows = [(t, m, st) for t in ticket_system.theaters for m in t.movies for st in m.show_times]
+    sold = {(t.name, st): [] for t, _, st in shows}
+    booked_count = [0] * num_threads
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        open_shows = list(shows)
+        attempts = 20 * sum(t.capacity for t, _, _ in shows)
+        while open_shows and attempts:
+            attempts -= 1
+            theater, movie, show_time = rng.choice(open_shows)
+            num_tickets = rng.randint(1, 4)
+            try:
+                if rng.random() < 0.5:
+                    booking = theater.book_ticket(movie, show_time, num_tickets)
+                else:
+                    first = rng.randint(1, theater.capacity - num_tickets + 1)
+                    booking = theater.claim_seats(movie, show_time, range(first, first + num_tickets))
+            except ValueError:
+                if theater.get_seat_map(show_time).free_count <= 0:
+                    open_shows.remove((theater, movie, show_time))
+                continue
+            sold[(theater.name, show_time)].append(booking.seats)
+            booked_count[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    oversold = 0
+    for (theater_name, show_time), bookings in sold.items():
+        seats = [seat for booking in bookings for seat in booking]
+        oversold += len(seats) - len(set(seats))
+        theater = ticket_system.get_theater(theater_name)
+        oversold += max(0, len(seats) - theater.capacity)
+    return sum(booked_count) / elapsed, oversold
+
+
+def bench_concurrency(args):
+    # A tiny switch interval makes threads interleave inside book_ticket as
+    # often as possible, which is what exposes unsynchronized overselling.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        print(f"{'threads':>8} {'bookings/s':>12} {'oversold':>9}")
+        for num_threads in (1, 2, 4, 8, 16):
+            ticket_system = build_system(args.theaters, 4, args.capacity // 10, concurrent=True)
+            throughput, oversold = stress_bookings(ticket_system, num_threads, args.seed)
+            print(f"{num_threads:>8} {throughput:>12,.0f} {oversold:>9}")
+            assert oversold == 0, "per-show locking let seats be sold twice"
+        ticket_system = build_system(args.theaters, 4, args.capacity // 10)
+        throughput, oversold = stress_bookings(ticket_system, 16, args.seed)
+        print(f"Without locks (16 threads): {oversold} seats oversold")
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+
+BENCHMARKS = {
+    "seats": bench_seat_maps,
+    "journal": bench_journal,
+    "concurrency": bench_concurrency,
+    "contiguous": bench_contiguous,
+    "loading": bench_loading,
+    "bookings": bench_bookings,
+    "holds": bench_holds,
+    "storage": bench_storage,
+    "availability": bench_availability,
+    "metrics": bench_metrics,
+    "batch": bench_batch,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the movie ticket management system")
+    parser.add_argument("benchmark", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--capacity", type=int, default=2000)
+    parser.add_argument("--theaters", type=int, default=100)
+    parser.add_argument("--shows", type=int, default=1000)
+    parser.add_argument("--holds", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--load-child", nargs=2, metavar=("MODE", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.load_child:
+        load_child(*args.load_child)
+        return
+    unknown = [name for name in args.benchmark if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    for name in args.benchmark or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
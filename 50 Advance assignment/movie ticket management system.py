@@ -1,5 +1,15 @@
+import base64
+import bisect
+import functools
 import json
-from datetime import datetime
+import os
+import sqlite3
+import sys
+import threading
+import time
+import warnings
+from contextlib import ExitStack, nullcontext
+from datetime import datetime, timedelta
 
 class Movie:
     def __init__(self, title, duration, rating):
@@ -17,22 +27,1075 @@ class Movie:
     def remove_show_time(self, show_time):
         self.show_times.remove(show_time)
 
+    def end_time(self, show_time):
+        return show_time + timedelta(minutes=self.duration)
+
+BIT_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+def longest_free_run(bits):
+    # Longest run of set bits without building a SeatRunTree. runs[k] has
+    # bit i set when the 2**k seats from i are all free; doubling builds
+    # those, then the run length is found one power of two at a time.
+    if not bits:
+        return 0
+    runs = [bits]
+    while True:
+        last = runs[-1]
+        longer = last & (last >> (1 << (len(runs) - 1)))
+        if not longer:
+            break
+        runs.append(longer)
+    length = 1 << (len(runs) - 1)
+    found = runs[-1]
+    for k in range(len(runs) - 2, -1, -1):
+        longer = found & (runs[k] >> length)
+        if longer:
+            found = longer
+            length += 1 << k
+    return length
+
+class SeatRunTree:
+    # Segment tree over the seats. Every node keeps the longest free run in
+    # its range and the free runs touching its left and right edges, which
+    # is enough to find the leftmost run of N adjacent free seats in
+    # O(log capacity).
+    def __init__(self, capacity, free_bits):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.size = size
+        self.prefix = [0] * (2 * size)
+        self.suffix = [0] * (2 * size)
+        self.best = [0] * (2 * size)
+        for i in range(capacity):
+            if free_bits >> i & 1:
+                self.prefix[size + i] = self.suffix[size + i] = self.best[size + i] = 1
+        for node in range(size - 1, 0, -1):
+            self.pull(node)
+
+    def pull(self, node):
+        prefix, suffix, best = self.prefix, self.suffix, self.best
+        left, right = 2 * node, 2 * node + 1
+        half = self.size >> node.bit_length()
+        prefix[node] = prefix[left] if prefix[left] < half else half + prefix[right]
+        suffix[node] = suffix[right] if suffix[right] < half else half + suffix[left]
+        best[node] = max(best[left], best[right], suffix[left] + prefix[right])
+
+    def longest_run(self):
+        return self.best[1]
+
+    def update(self, seat_numbers, free):
+        value = 1 if free else 0
+        nodes = set()
+        for seat in seat_numbers:
+            leaf = self.size + seat - 1
+            self.prefix[leaf] = self.suffix[leaf] = self.best[leaf] = value
+            nodes.add(leaf >> 1)
+        while nodes:
+            for node in nodes:
+                self.pull(node)
+            nodes = {node >> 1 for node in nodes if node > 1}
+
+    def find(self, num_seats):
+        # Returns the first seat number of the leftmost free run that is at
+        # least num_seats long, or 0 when there is none.
+        prefix, suffix, best = self.prefix, self.suffix, self.best
+        if num_seats <= 0 or best[1] < num_seats:
+            return 0
+        node, start, span = 1, 0, self.size
+        while node < self.size:
+            span //= 2
+            left, right = 2 * node, 2 * node + 1
+            if best[left] >= num_seats:
+                node = left
+            elif suffix[left] + prefix[right] >= num_seats:
+                return start + span - suffix[left] + 1
+            else:
+                node = right
+                start += span
+        return start + 1
+
+class SeatMap:
+    # One bit per seat (bit i set means seat i + 1 is free) plus a running
+    # free counter, so availability checks are O(1) and allocation works on
+    # whole machine words inside the int instead of on a list of booleans.
+    # The run tree used for adjacent seating is only built on first use.
+    # Held seats are neither free nor sold; they are saved as free, so a
+    # restart simply drops every hold.
+    __slots__ = ("capacity", "free_bits", "free_count", "held_bits", "runs")
+
+    def __init__(self, capacity, free_bits=None):
+        self.capacity = capacity
+        if free_bits is None:
+            free_bits = (1 << capacity) - 1
+        self.free_bits = free_bits
+        self.free_count = free_bits.bit_count()
+        self.held_bits = 0
+        self.runs = None
+
+    def __len__(self):
+        return self.capacity
+
+    @classmethod
+    def from_list(cls, capacity, seats):
+        # bytes() turns the booleans into 0/1 bytes in C and translate()
+        # maps those to the digits int() parses, with no per-seat Python work.
+        bits = bytes(reversed(seats)).translate(BIT_DIGITS)
+        return cls(capacity, int(bits or b"0", 2))
+
+    def to_list(self):
+        bits = format(self.free_bits | self.held_bits, "b").zfill(self.capacity)
+        return [bit == "1" for bit in reversed(bits)]
+
+    @classmethod
+    def from_bytes(cls, capacity, data):
+        return cls(capacity, int.from_bytes(data, "little"))
+
+    def to_bytes(self):
+        return (self.free_bits | self.held_bits).to_bytes((self.capacity + 7) // 8, "little")
+
+    @classmethod
+    def from_binary(cls, capacity, text):
+        return cls.from_bytes(capacity, base64.b64decode(text))
+
+    def to_binary(self):
+        # Base64 of the little-endian bitset: about 1.4 characters per 8
+        # seats on disk instead of ~6 characters per seat for a JSON list.
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def decode(cls, capacity, value):
+        if isinstance(value, str):
+            return cls.from_binary(capacity, value)
+        if isinstance(value, bytes):
+            return cls.from_bytes(capacity, value)
+        return cls.from_list(capacity, value)
+
+    def encode(self, seat_format):
+        return self.to_binary() if seat_format == "binary" else self.to_list()
+
+    def check_seat(self, seat):
+        if seat <= 0 or seat > self.capacity:
+            raise ValueError(f"Invalid seat number: {seat}")
+
+    def is_free(self, seat):
+        self.check_seat(seat)
+        return bool(self.free_bits >> (seat - 1) & 1)
+
+    def is_held(self, seat):
+        self.check_seat(seat)
+        return bool(self.held_bits >> (seat - 1) & 1)
+
+    def seat_mask(self, seat_numbers):
+        mask = 0
+        for seat in seat_numbers:
+            self.check_seat(seat)
+            bit = 1 << (seat - 1)
+            if mask & bit:
+                raise ValueError(f"Duplicate seat number: {seat}")
+            mask |= bit
+        return mask
+
+    def hold(self, seat_numbers):
+        # Seats just taken by allocate or claim move from sold to held.
+        self.held_bits |= self.seat_mask(seat_numbers)
+
+    def sell_held(self, seat_numbers):
+        mask = self.seat_mask(seat_numbers)
+        if mask & ~self.held_bits:
+            raise ValueError("Seats are no longer held")
+        self.held_bits &= ~mask
+
+    def release_held(self, seat_numbers):
+        # Expired holds go back to free, skipping any seat no longer held.
+        still_held = [seat for seat in seat_numbers if self.held_bits >> (seat - 1) & 1]
+        self.release(still_held)
+
+    def allocate(self, num_seats):
+        if num_seats <= 0:
+            raise ValueError("Number of tickets must be positive")
+        if self.free_count < num_seats:
+            raise ValueError(f"Not enough seats available. Only {self.free_count} seats left.")
+        bits = self.free_bits
+        seats = []
+        for _ in range(num_seats):
+            lowest = bits & -bits
+            seats.append(lowest.bit_length())
+            bits ^= lowest
+        self.free_bits = bits
+        self.free_count -= num_seats
+        if self.runs:
+            self.runs.update(seats, False)
+        return seats
+
+    def run_tree(self):
+        if self.runs is None:
+            self.runs = SeatRunTree(self.capacity, self.free_bits)
+        return self.runs
+
+    def longest_run(self):
+        if self.runs:
+            return self.runs.longest_run()
+        return longest_free_run(self.free_bits)
+
+    def allocate_contiguous(self, num_seats, fallback="fail"):
+        # fallback decides what happens when no single run is long enough:
+        # "fail" raises, "scatter" takes the first free seats anywhere and
+        # "split" seats the group in as few adjacent blocks as possible.
+        if num_seats <= 0:
+            raise ValueError("Number of tickets must be positive")
+        if self.free_count < num_seats:
+            raise ValueError(f"Not enough seats available. Only {self.free_count} seats left.")
+        runs = self.run_tree()
+        first = runs.find(num_seats)
+        if first:
+            return self.claim(range(first, first + num_seats))
+        if fallback == "scatter":
+            return self.allocate(num_seats)
+        if fallback != "split":
+            raise ValueError(f"No {num_seats} adjacent seats available. Longest run is {runs.longest_run()}.")
+        seats = []
+        while len(seats) < num_seats:
+            block = min(num_seats - len(seats), runs.longest_run())
+            first = runs.find(block)
+            seats.extend(self.claim(range(first, first + block)))
+        return sorted(seats)
+
+    def release(self, seat_numbers):
+        mask = self.seat_mask(seat_numbers)
+        self.free_count += (mask & ~self.free_bits).bit_count()
+        self.free_bits |= mask
+        self.held_bits &= ~mask
+        if self.runs:
+            self.runs.update(seat_numbers, True)
+
+    def claim(self, seat_numbers):
+        # All-or-nothing: either every requested seat is taken or none is.
+        mask = self.seat_mask(seat_numbers)
+        taken = mask & ~self.free_bits
+        if taken:
+            seats = [seat for seat in seat_numbers if taken >> (seat - 1) & 1]
+            raise ValueError(f"Seats already booked: {seats}")
+        self.free_bits &= ~mask
+        self.free_count -= mask.bit_count()
+        if self.runs:
+            self.runs.update(seat_numbers, False)
+        return list(seat_numbers)
+
+    def mark_booked(self, seat_numbers):
+        mask = self.seat_mask(seat_numbers)
+        self.free_count -= (mask & self.free_bits).bit_count()
+        self.free_bits &= ~mask
+        if self.runs:
+            self.runs.update(seat_numbers, False)
+
+class Booking:
+    __slots__ = ("booking_id", "theater_name", "movie_title", "show_time", "seats", "customer")
+
+    def __init__(self, booking_id, theater_name, movie_title, show_time, seats, customer=None):
+        self.booking_id = booking_id
+        self.theater_name = theater_name
+        self.movie_title = movie_title
+        self.show_time = show_time
+        self.seats = seats
+        self.customer = customer
+
+    def __str__(self):
+        return (f"#{self.booking_id}: {self.movie_title} at {self.theater_name}, "
+                f"{self.show_time:%Y-%m-%d %H:%M}, seats {self.seats}")
+
+    def to_data(self):
+        return [self.booking_id, self.theater_name, self.movie_title, self.show_time.isoformat(), self.seats, self.customer]
+
+    @classmethod
+    def from_data(cls, data):
+        booking_id, theater_name, movie_title, show_time, seats, customer = data
+        return cls(booking_id, theater_name, movie_title, datetime.fromisoformat(show_time), seats, customer)
+
+class BookingRegistry:
+    # Every live booking by ID, plus reverse indexes from each booked seat
+    # and from each customer back to the booking, so finding or cancelling
+    # a booking costs O(seats in the booking) however big the chain is.
+    def __init__(self):
+        self.next_id = 1
+        self.bookings = {}
+        self.seat_owners = {}
+        self.show_bookings = {}
+        self.customers = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.bookings)
+
+    def get(self, booking_id):
+        return self.bookings.get(booking_id)
+
+    def owner(self, theater_name, show_time, seat):
+        booking_id = self.seat_owners.get((theater_name, show_time, seat))
+        return self.bookings.get(booking_id)
+
+    def customer_bookings(self, customer):
+        return [self.bookings[booking_id] for booking_id in self.customers.get(customer, ())]
+
+    def add(self, theater_name, movie_title, show_time, seats, customer=None, booking_id=None):
+        with self.lock:
+            if booking_id is None:
+                booking_id = self.next_id
+            self.next_id = max(self.next_id, booking_id + 1)
+            booking = Booking(booking_id, theater_name, movie_title, show_time, list(seats), customer)
+            self.bookings[booking_id] = booking
+            for seat in booking.seats:
+                self.seat_owners[(theater_name, show_time, seat)] = booking_id
+            self.show_bookings.setdefault((theater_name, show_time), {})[booking_id] = None
+            if customer is not None:
+                # A dict used as an ordered set keeps history in booking
+                # order and still removes in O(1).
+                self.customers.setdefault(customer, {})[booking_id] = None
+        return booking
+
+    def remove(self, booking_id):
+        with self.lock:
+            booking = self.bookings.pop(booking_id)
+            for seat in booking.seats:
+                self.seat_owners.pop((booking.theater_name, booking.show_time, seat), None)
+            self.show_bookings[(booking.theater_name, booking.show_time)].pop(booking_id)
+            if booking.customer is not None:
+                history = self.customers[booking.customer]
+                history.pop(booking_id)
+                if not history:
+                    del self.customers[booking.customer]
+        return booking
+
+    def release_seats(self, theater_name, show_time, seat_numbers):
+        # Bookings that lose every seat are removed whole; the rest keep
+        # the seats that were not released.
+        released = {}
+        for seat in seat_numbers:
+            booking_id = self.seat_owners.get((theater_name, show_time, seat))
+            if booking_id is not None:
+                released.setdefault(booking_id, set()).add(seat)
+        for booking_id, seats in released.items():
+            booking = self.bookings[booking_id]
+            if len(seats) == len(booking.seats):
+                self.remove(booking_id)
+                continue
+            with self.lock:
+                for seat in seats:
+                    del self.seat_owners[(theater_name, show_time, seat)]
+                booking.seats = [seat for seat in booking.seats if seat not in seats]
+
+    def drop_show(self, theater_name, show_time):
+        for booking_id in list(self.show_bookings.get((theater_name, show_time), ())):
+            self.remove(booking_id)
+        self.show_bookings.pop((theater_name, show_time), None)
+
+class Hold:
+    __slots__ = ("hold_id", "theater", "movie", "show_time", "seats", "customer", "expires_at", "slot")
+
+    def __init__(self, hold_id, theater, movie, show_time, seats, customer, expires_at):
+        self.hold_id = hold_id
+        self.theater = theater
+        self.movie = movie
+        self.show_time = show_time
+        self.seats = seats
+        self.customer = customer
+        self.expires_at = expires_at
+        self.slot = None
+
+class HoldWheel:
+    # Hashed timing wheel: a ring of slots, each one tick wide, holding the
+    # holds that expire in that tick. Adding or removing a hold is O(1) and
+    # each tick only looks at its own slot, so expiry costs O(1) amortized
+    # per hold instead of a scan over every seat. Holds longer than one
+    # turn of the wheel are simply looked at again on the next turn.
+    def __init__(self, tick=1.0, num_slots=1024, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.slots = [{} for _ in range(num_slots)]
+        self.holds = {}
+        self.next_id = 1
+        self.current_tick = int(clock() / tick)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.holds)
+
+    def get(self, hold_id):
+        return self.holds.get(hold_id)
+
+    def add(self, theater, movie, show_time, seats, ttl, customer=None):
+        with self.lock:
+            hold = Hold(self.next_id, theater, movie, show_time, seats, customer, self.clock() + ttl)
+            self.next_id += 1
+            hold.slot = max(int(hold.expires_at / self.tick), self.current_tick) % len(self.slots)
+            self.slots[hold.slot][hold.hold_id] = hold
+            self.holds[hold.hold_id] = hold
+        return hold
+
+    def pop(self, hold_id):
+        with self.lock:
+            hold = self.holds.pop(hold_id, None)
+            if hold:
+                del self.slots[hold.slot][hold_id]
+        return hold
+
+    def drop(self, theater, show_times=None):
+        # Forgets the holds on shows that are being removed (every show of
+        # theater when show_times is None); their seats go with the show.
+        with self.lock:
+            dropped = [hold for hold in self.holds.values() if hold.theater is theater
+                       and (show_times is None or hold.show_time in show_times)]
+            for hold in dropped:
+                del self.holds[hold.hold_id]
+                del self.slots[hold.slot][hold.hold_id]
+        return dropped
+
+    def advance(self):
+        # Expires the holds of every tick that has fully passed and returns
+        # them; current_tick is the first tick not yet processed. A long gap
+        # visits each slot at most once.
+        now_tick = int(self.clock() / self.tick)
+        deadline = now_tick * self.tick
+        expired = []
+        with self.lock:
+            if now_tick <= self.current_tick:
+                return expired
+            first = max(self.current_tick, now_tick - len(self.slots))
+            for t in range(first, now_tick):
+                slot = self.slots[t % len(self.slots)]
+                due = [hold for hold in slot.values() if hold.expires_at < deadline]
+                for hold in due:
+                    del slot[hold.hold_id]
+                    del self.holds[hold.hold_id]
+                expired.extend(due)
+            self.current_tick = now_tick
+        for hold in expired:
+            # The holds are already out of the wheel, so one that cannot be
+            # released must not stop the rest from being released.
+            try:
+                hold.theater.release_hold(hold)
+            except ValueError:
+                pass
+        return expired
+
+class ShowSchedule:
+    # Every show in one theater as (start, end, movie), sorted by start.
+    # No show is longer than longest, so the shows overlapping [start, end)
+    # all begin in [start - longest, end) and one bisect finds them.
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.movies = []
+        self.longest = timedelta(0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def between(self, start, end):
+        i = bisect.bisect_left(self.starts, start - self.longest)
+        while i < len(self.starts) and self.starts[i] < end:
+            if self.ends[i] > start or self.starts[i] == start:
+                yield self.starts[i], self.ends[i], self.movies[i]
+            i += 1
+
+    def starting_from(self, start):
+        for i in range(bisect.bisect_left(self.starts, start), len(self.starts)):
+            yield self.starts[i], self.ends[i], self.movies[i]
+
+    def clash(self, start, end):
+        return next(self.between(start, end), None)
+
+    def add(self, movie, start, check=True):
+        end = movie.end_time(start)
+        if check:
+            clash = self.clash(start, end)
+            if clash:
+                raise ValueError(
+                    f"{movie.title} at {start:%Y-%m-%d %H:%M} clashes with "
+                    f"{clash[2].title} at {clash[0]:%Y-%m-%d %H:%M}-{clash[1]:%H:%M}"
+                )
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.movies.insert(i, movie)
+        self.longest = max(self.longest, end - start)
+
+    def remove(self, movie, start):
+        i = bisect.bisect_left(self.starts, start)
+        while self.movies[i] is not movie:
+            i += 1
+        del self.starts[i], self.ends[i], self.movies[i]
+
+class AvailabilityIndex:
+    # Free seats and longest free run of every show in every theater. Show
+    # times are kept sorted, and each one holds a list of (free count,
+    # theater name, longest run) sorted too, so a search bisects to the
+    # first show in its window and, within each show time, straight to the
+    # shows with enough free seats.
+    def __init__(self):
+        self.times = []
+        self.by_time = {}
+        self.shows = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.shows)
+
+    def get(self, theater_name, show_time):
+        return self.shows.get((theater_name, show_time))
+
+    def unlink(self, theater_name, show_time, free_count):
+        entries = self.by_time[show_time]
+        del entries[bisect.bisect_left(entries, (free_count, theater_name))]
+        if not entries:
+            del self.by_time[show_time]
+            del self.times[bisect.bisect_left(self.times, show_time)]
+
+    def update(self, theater_name, show_time, free_count, longest_run):
+        key = (theater_name, show_time)
+        with self.lock:
+            old = self.shows.get(key)
+            if old == (free_count, longest_run):
+                return
+            if old is not None:
+                self.unlink(theater_name, show_time, old[0])
+            entries = self.by_time.get(show_time)
+            if entries is None:
+                entries = self.by_time[show_time] = []
+                bisect.insort(self.times, show_time)
+            bisect.insort(entries, (free_count, theater_name, longest_run))
+            self.shows[key] = (free_count, longest_run)
+
+    def discard(self, theater_name, show_time):
+        with self.lock:
+            old = self.shows.pop((theater_name, show_time), None)
+            if old is not None:
+                self.unlink(theater_name, show_time, old[0])
+
+    def search(self, start, end, num_seats=1, contiguous=False):
+        # Shows starting in [start, end) with at least num_seats free, or
+        # num_seats adjacent free when contiguous, as (theater name, show
+        # time, free count, longest run) in show time order.
+        results = []
+        with self.lock:
+            first = bisect.bisect_left(self.times, start)
+            last = bisect.bisect_left(self.times, end)
+            for show_time in self.times[first:last]:
+                entries = self.by_time[show_time]
+                for i in range(bisect.bisect_left(entries, (num_seats,)), len(entries)):
+                    free_count, theater_name, longest_run = entries[i]
+                    if not contiguous or longest_run >= num_seats:
+                        results.append((theater_name, show_time, free_count, longest_run))
+        return results
+
+class LockStripes:
+    # A fixed pool of locks shared by all shows. Each (theater, show time)
+    # always maps to the same lock, so bookings for one show are serialized
+    # while different shows mostly proceed in parallel.
+    def __init__(self, count=64):
+        self.locks = [threading.Lock() for _ in range(count)]
+
+    def lock_for(self, theater_name, show_time):
+        return self.locks[hash((theater_name, show_time)) % len(self.locks)]
+
+    def locks_for(self, shows):
+        # The distinct locks for several (theater name, show time) pairs in
+        # one fixed order, so threads taking more than one never deadlock.
+        indexes = sorted({hash(show) % len(self.locks) for show in shows})
+        return [self.locks[i] for i in indexes]
+
+class JsonStreamReader:
+    # Pulls one JSON value at a time out of a file without reading the whole
+    # file first. Reads grow geometrically while a value is incomplete, so a
+    # large value is re-scanned only O(log size) times.
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size):
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill(self.chunk_size):
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed data file: expected {char!r} at {self.buffer[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def skip_comma(self):
+        if self.peek() == ",":
+            self.pos += 1
+
+    def value(self):
+        size = self.chunk_size
+        while True:
+            self.peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill(size):
+                    raise
+                size *= 2
+                continue
+            # A number that ends exactly at the buffer edge may continue in
+            # the next chunk.
+            if end == len(self.buffer) and not self.eof and self.fill(size):
+                continue
+            self.pos = end
+            return value
+
+def iter_snapshot(f):
+    # Yields ("theater", data) for each theater in turn, then (key, value)
+    # for any other top-level key in the snapshot.
+    reader = JsonStreamReader(f)
+    reader.expect("{")
+    while reader.peek() not in ("}", ""):
+        key = reader.value()
+        reader.expect(":")
+        if key == "theaters":
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield "theater", reader.value()
+                reader.skip_comma()
+            reader.expect("]")
+        else:
+            yield key, reader.value()
+        reader.skip_comma()
+    reader.expect("}")
+
+class BookingJournal:
+    # Append-only log of every change made since the last snapshot, one
+    # compact JSON list per line. Records set seats to a state rather than
+    # counting them, so replaying a tail that already reached the snapshot
+    # (a crash between snapshot and truncate) leaves the same result.
+    # With group_commit, appends stay in the file buffer until commit(), so
+    # one flush (and fsync, with sync) covers every record since the last.
+    def __init__(self, filename, snapshot_every=1000, on_snapshot=None, sync=False, group_commit=False):
+        self.filename = filename
+        self.snapshot_every = snapshot_every
+        self.on_snapshot = on_snapshot
+        self.sync = sync
+        self.group_commit = group_commit
+        self.records = sum(1 for _ in self.read(filename))
+        self.file = open(filename, "a")
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def read(filename):
+        try:
+            f = open(filename, "r")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append.
+                    return
+
+    def append(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            self.file.write(line)
+            if not self.group_commit:
+                self.commit()
+            self.records += 1
+            if self.on_snapshot and self.records >= self.snapshot_every:
+                self.on_snapshot()
+
+    def commit(self):
+        with self.lock:
+            self.file.flush()
+            if self.sync:
+                os.fsync(self.file.fileno())
+
+    def truncate(self):
+        with self.lock:
+            self.file.truncate(0)
+            self.records = 0
+
+    def close(self):
+        self.file.close()
+
+class LatencyHistogram:
+    # HDR-style log-linear buckets over nanoseconds: values below 2 * 2**bits
+    # get a bucket each, and every power of two above that is split into
+    # 2**bits linear buckets, so any value is reported within 1/2**bits of
+    # what was recorded using a few hundred counters.
+    def __init__(self, bits=5):
+        self.bits = bits
+        self.counts = [0] * (64 << bits)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def index(self, value):
+        shift = value.bit_length() - self.bits - 1
+        if shift <= 0:
+            return value
+        return (shift << self.bits) + (value >> shift)
+
+    def bucket_high(self, index):
+        # The largest value that lands in bucket index.
+        shift = (index >> self.bits) - 1
+        if shift <= 0:
+            return index
+        return ((index - (shift << self.bits) + 1) << shift) - 1
+
+    def record(self, value):
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_high(index), self.max)
+        return self.max
+
+    def buckets(self):
+        # (largest value in bucket, count) for every non-empty bucket.
+        return [(self.bucket_high(index), count) for index, count in enumerate(self.counts) if count]
+
+class Metrics:
+    # Latency histograms (in nanoseconds) and call counts per operation.
+    # Enabling metrics puts a timing wrapper on each attached object's
+    # methods as an instance attribute; disabling removes it again, so
+    # while disabled the class methods are called directly at no cost.
+    QUANTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counts = {}
+        self.targets = {}
+        self.lock = threading.Lock()
+
+    def attach(self, target, *ops):
+        self.targets[target] = ops
+        self.instrument(target, ops)
+
+    def detach(self, target):
+        for op in self.targets.pop(target, ()):
+            target.__dict__.pop(op, None)
+
+    def instrument(self, target, ops):
+        for op in ops:
+            if self.enabled:
+                setattr(target, op, self.timed(op, getattr(type(target), op).__get__(target)))
+            else:
+                target.__dict__.pop(op, None)
+
+    def timed(self, op, method):
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            start = time.perf_counter_ns()
+            outcome = "error"
+            try:
+                result = method(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                self.record(op, time.perf_counter_ns() - start, outcome)
+        return timed_method
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        for target, ops in list(self.targets.items()):
+            self.instrument(target, ops)
+
+    def enable(self):
+        self.set_enabled(True)
+
+    def disable(self):
+        self.set_enabled(False)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counts = {}
+
+    def record(self, op, nanos, outcome):
+        with self.lock:
+            histogram = self.histograms.get(op)
+            if histogram is None:
+                histogram = self.histograms[op] = LatencyHistogram()
+            histogram.record(nanos)
+            key = (op, outcome)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    @staticmethod
+    def seat_map_sizes(ticket_system):
+        loaded = pending = seat_bytes = run_trees = 0
+        for theater in list(ticket_system.theaters):
+            for seat_map in list(theater.seats.values()):
+                loaded += 1
+                seat_bytes += sys.getsizeof(seat_map.free_bits) + sys.getsizeof(seat_map.held_bits)
+                run_trees += seat_map.runs is not None
+            for value in list(theater.pending_seats.values()):
+                pending += 1
+                seat_bytes += sys.getsizeof(value)
+        return {
+            "theaters": len(ticket_system.theaters),
+            "shows_loaded": loaded,
+            "shows_pending": pending,
+            "seat_bytes": seat_bytes,
+            "run_trees": run_trees,
+            "bookings": len(ticket_system.bookings),
+            "holds": len(ticket_system.holds),
+        }
+
+    def snapshot(self, ticket_system=None):
+        with self.lock:
+            operations = {}
+            for op, histogram in self.histograms.items():
+                operations[op] = {
+                    "count": histogram.count,
+                    "outcomes": {outcome: count for (name, outcome), count in self.counts.items() if name == op},
+                    "sum_ns": histogram.total,
+                    "min_ns": histogram.min,
+                    "max_ns": histogram.max,
+                    "percentiles_ns": {str(q): histogram.percentile(q) for q in self.QUANTILES},
+                    "buckets_ns": histogram.buckets(),
+                }
+        data = {"operations": operations}
+        if ticket_system is not None:
+            data["sizes"] = self.seat_map_sizes(ticket_system)
+        return data
+
+    def to_json(self, ticket_system=None):
+        return json.dumps(self.snapshot(ticket_system))
+
+    def to_prometheus(self, ticket_system=None):
+        # Text exposition format: latencies as summaries in seconds, call
+        # counts by outcome, and seat map sizes as gauges.
+        data = self.snapshot(ticket_system)
+        lines = [
+            "# HELP ticket_operation_seconds Latency of ticket system operations.",
+            "# TYPE ticket_operation_seconds summary",
+        ]
+        for op, stats in data["operations"].items():
+            for q, nanos in stats["percentiles_ns"].items():
+                lines.append(f'ticket_operation_seconds{{op="{op}",quantile="{float(q) / 100:g}"}} {nanos / 1e9:.9f}')
+            lines.append(f'ticket_operation_seconds_sum{{op="{op}"}} {stats["sum_ns"] / 1e9:.9f}')
+            lines.append(f'ticket_operation_seconds_count{{op="{op}"}} {stats["count"]}')
+        lines.append("# HELP ticket_operations_total Ticket system operations by outcome.")
+        lines.append("# TYPE ticket_operations_total counter")
+        for op, stats in data["operations"].items():
+            for outcome, count in stats["outcomes"].items():
+                lines.append(f'ticket_operations_total{{op="{op}",outcome="{outcome}"}} {count}')
+        for name, value in data.get("sizes", {}).items():
+            lines.append(f"# TYPE ticket_{name} gauge")
+            lines.append(f"ticket_{name} {value}")
+        return "\n".join(lines) + "\n"
+
 class Theater:
     def __init__(self, name, capacity):
         self.name = name
         self.capacity = capacity
         self.movies = []
+        self.movie_index = {}
+        self.schedule = ShowSchedule()
         self.seats = {}
+        # Seats read from a compact snapshot stay encoded here until the
+        # show is first touched.
+        self.pending_seats = {}
+        self.journal = None
+        self.locks = None
+        # A theater in a TicketSystem shares the system's registry and hold
+        # wheel; a standalone one builds its own on first use.
+        self.bookings = None
+        self.holds = None
+        self.availability = None
+
+    def booking_registry(self):
+        if self.bookings is None:
+            self.bookings = BookingRegistry()
+        return self.bookings
+
+    def hold_wheel(self):
+        if self.holds is None:
+            self.holds = HoldWheel()
+        return self.holds
+
+    def log(self, op, *fields):
+        if self.journal:
+            self.journal.append([op, self.name, *fields])
+
+    def log_movie(self, movie):
+        self.log("movie", movie.title, movie.duration, movie.rating, [st.isoformat() for st in movie.show_times])
 
     def add_movie(self, movie):
+        if movie.title in self.movie_index:
+            raise ValueError(f"Movie already exists: {movie.title}")
+        added = []
+        try:
+            for show_time in movie.show_times:
+                self.schedule.add(movie, show_time)
+                added.append(show_time)
+        except ValueError:
+            for show_time in added:
+                self.schedule.remove(movie, show_time)
+            raise
         self.movies.append(movie)
+        self.movie_index[movie.title] = movie
         for show_time in movie.show_times:
-            self.seats[show_time] = [True] * self.capacity
+            self.seats[show_time] = SeatMap(self.capacity)
+            self.update_availability(show_time, self.seats[show_time])
+        self.log_movie(movie)
 
     def remove_movie(self, movie):
         self.movies.remove(movie)
+        del self.movie_index[movie.title]
+        if self.holds is not None:
+            self.holds.drop(self, movie.show_times)
         for show_time in movie.show_times:
-            del self.seats[show_time]
+            self.schedule.remove(movie, show_time)
+            if self.bookings is not None:
+                self.bookings.drop_show(self.name, show_time)
+            self.seats.pop(show_time, None)
+            self.pending_seats.pop(show_time, None)
+            if self.availability is not None:
+                self.availability.discard(self.name, show_time)
+        self.log("remove_movie", movie.title)
+
+    def add_show_time(self, movie, show_time):
+        self.schedule.add(movie, show_time)
+        movie.add_show_time(show_time)
+        self.seats[show_time] = SeatMap(self.capacity)
+        self.pending_seats.pop(show_time, None)
+        self.update_availability(show_time, self.seats[show_time])
+        self.log("show", movie.title, show_time.isoformat())
+
+    def get_movie(self, title):
+        return self.movie_index.get(title)
+
+    def show_lock(self, show_time):
+        if self.locks is None:
+            return nullcontext()
+        return self.locks.lock_for(self.name, show_time)
+
+    def has_show(self, show_time):
+        return show_time in self.seats or show_time in self.pending_seats
+
+    def get_seat_map(self, show_time):
+        seat_map = self.seats.get(show_time)
+        if seat_map is None:
+            with self.show_lock(show_time):
+                seat_map = self.seats.get(show_time)
+                if seat_map is None:
+                    if show_time not in self.pending_seats:
+                        raise ValueError("Invalid show time")
+                    seat_map = SeatMap.decode(self.capacity, self.pending_seats[show_time])
+                    self.seats[show_time] = seat_map
+                    del self.pending_seats[show_time]
+        return seat_map
+
+    def seat_bytes(self, show_time):
+        # The show's seats as SeatMap.to_bytes() gives them; a pending show
+        # is decoded on the side and left pending, without the show lock.
+        seat_map = self.seats.get(show_time)
+        if seat_map is None:
+            value = self.pending_seats.get(show_time)
+            if value is not None:
+                return SeatMap.decode(self.capacity, value).to_bytes()
+            seat_map = self.get_seat_map(show_time)
+        return seat_map.to_bytes()
+
+    def update_availability(self, show_time, seat_map):
+        # Called under the show lock after every change to a show's seats.
+        if self.availability is not None:
+            self.availability.update(self.name, show_time, seat_map.free_count, seat_map.longest_run())
+
+    def index_availability(self, availability):
+        # Pending seats are decoded only long enough to be counted, so
+        # building the index does not undo lazy loading.
+        self.availability = availability
+        for show_time in [*self.seats, *self.pending_seats]:
+            with self.show_lock(show_time):
+                seat_map = self.seats.get(show_time)
+                if seat_map is None:
+                    value = self.pending_seats.get(show_time)
+                    if value is None:
+                        continue
+                    seat_map = SeatMap.decode(self.capacity, value)
+                self.update_availability(show_time, seat_map)
+
+    def movie_at(self, show_time):
+        i = bisect.bisect_left(self.schedule.starts, show_time)
+        if i < len(self.schedule) and self.schedule.starts[i] == show_time:
+            return self.schedule.movies[i]
+        return None
+
+    def encoded_seats(self, seat_format):
+        # list() copies each dict in one step, so a snapshot taken while
+        # other threads book does not see the dicts change size mid-loop.
+        seats = {st.isoformat(): seat_map.encode(seat_format) for st, seat_map in list(self.seats.items())}
+        for st, value in list(self.pending_seats.items()):
+            if seat_format != "binary" or not isinstance(value, str):
+                value = SeatMap.decode(self.capacity, value).encode(seat_format)
+            seats[st.isoformat()] = value
+        return seats
+
+    @classmethod
+    def from_data(cls, theater_data, lazy=True):
+        theater = cls(theater_data["name"], theater_data["capacity"])
+        for movie_data in theater_data["movies"]:
+            show_times = [datetime.fromisoformat(st) for st in movie_data["show_times"]]
+            movie = theater.get_movie(movie_data["title"])
+            if movie is None:
+                movie = Movie(movie_data["title"], movie_data["duration"], movie_data["rating"])
+                theater.add_movie(movie)
+            # Older files can repeat a title once per show time. Clashes
+            # already on file are loaded as they are rather than rejected.
+            for show_time in show_times:
+                theater.schedule.add(movie, show_time, check=False)
+            movie.show_times.extend(show_times)
+        for st, value in theater_data["seats"].items():
+            # A JSON list is already fully parsed and costs more memory
+            # than the seat map built from it, so only compact seats wait.
+            if lazy and not isinstance(value, list):
+                theater.pending_seats[datetime.fromisoformat(st)] = value
+            else:
+                theater.seats[datetime.fromisoformat(st)] = SeatMap.decode(theater.capacity, value)
+        return theater
+
+    def shows_between(self, start, end):
+        return list(self.schedule.between(start, end))
+
+    def next_available_show(self, after, num_tickets, contiguous=False):
+        for start, _, movie in self.schedule.starting_from(after):
+            seat_map = self.get_seat_map(start)
+            available = seat_map.longest_run() if contiguous else seat_map.free_count
+            if available >= num_tickets:
+                return movie, start
+        return None
 
     def display_movies(self):
         for movie in self.movies:
@@ -42,42 +1105,165 @@ class Theater:
         for show_time in movie.show_times:
             print(show_time.strftime("%Y-%m-%d %H:%M"))
 
-    def book_ticket(self, movie, show_time, num_tickets):
-        if show_time not in self.seats:
-            raise ValueError("Invalid show time")
-        available_seats = self.seats[show_time].count(True)
-        if available_seats < num_tickets:
-            raise ValueError(f"Not enough seats available. Only {available_seats} seats left.")
-        booked_seats = []
-        for i, seat in enumerate(self.seats[show_time]):
-            if seat and len(booked_seats) < num_tickets:
-                self.seats[show_time][i] = False
-                booked_seats.append(i + 1)
-        return booked_seats
-
-    def cancel_booking(self, movie, show_time, seat_numbers):
-        if show_time not in self.seats:
-            raise ValueError("Invalid show time")
-        for seat in seat_numbers:
-            if seat <= 0 or seat > self.capacity:
-                raise ValueError(f"Invalid seat number: {seat}")
-            self.seats[show_time][seat - 1] = True
+    def record_booking(self, movie, show_time, booked_seats, customer):
+        booking = self.booking_registry().add(self.name, movie.title, show_time, booked_seats, customer)
+        self.log("book", show_time.isoformat(), booked_seats, booking.booking_id, movie.title, customer)
+        return booking
 
-class TicketSystem:
-    def __init__(self):
-        self.theaters = []
+    def book_ticket(self, movie, show_time, num_tickets, contiguous=False, fallback="fail", customer=None, hold_id=None):
+        if hold_id is not None:
+            return self.book_hold(hold_id, customer)
+        if self.holds is not None:
+            self.holds.advance()
+        seat_map = self.get_seat_map(show_time)
+        with self.show_lock(show_time):
+            if contiguous:
+                booked_seats = seat_map.allocate_contiguous(num_tickets, fallback)
+            else:
+                booked_seats = seat_map.allocate(num_tickets)
+            self.update_availability(show_time, seat_map)
+            return self.record_booking(movie, show_time, booked_seats, customer)
 
-    def add_theater(self, theater):
-        self.theaters.append(theater)
+    def allocate_lines(self, seat_map, lines):
+        # Seats for several (num_tickets, contiguous) lines of one show, in
+        # line order, as a seat list or the ValueError for each line. Runs of
+        # plain lines are counted against the free seats and then allocated
+        # together, which gives the seats one book_ticket call per line would.
+        allocated = [None] * len(lines)
+        batch = []
+        free_count = seat_map.free_count
+        for i, (num_tickets, contiguous) in enumerate(lines):
+            if num_tickets <= 0:
+                allocated[i] = ValueError("Number of tickets must be positive")
+            elif contiguous:
+                self.allocate_batch(seat_map, lines, batch, allocated)
+                try:
+                    allocated[i] = seat_map.allocate_contiguous(num_tickets)
+                except ValueError as e:
+                    allocated[i] = e
+                free_count = seat_map.free_count
+            elif num_tickets > free_count:
+                allocated[i] = ValueError(f"Not enough seats available. Only {free_count} seats left.")
+            else:
+                free_count -= num_tickets
+                batch.append(i)
+        self.allocate_batch(seat_map, lines, batch, allocated)
+        return allocated
 
-    def remove_theater(self, theater):
-        self.theaters.remove(theater)
+    @staticmethod
+    def allocate_batch(seat_map, lines, batch, allocated):
+        if not batch:
+            return
+        seats = seat_map.allocate(sum(lines[i][0] for i in batch))
+        start = 0
+        for i in batch:
+            allocated[i] = seats[start:start + lines[i][0]]
+            start += lines[i][0]
+        batch.clear()
 
-    def display_theaters(self):
-        for theater in self.theaters:
-            print(f"{theater.name} (Capacity: {theater.capacity})")
+    def record_lines(self, show_time, seat_map, lines, allocated, results):
+        self.update_availability(show_time, seat_map)
+        for (i, movie, _, _, customer), seats in zip(lines, allocated):
+            if isinstance(seats, ValueError):
+                results[i] = (False, str(seats))
+            else:
+                results[i] = (True, self.record_booking(movie, show_time, seats, customer))
 
-    def save_to_file(self, filename):
+    def hold_seats(self, movie, show_time, num_tickets, ttl=300, contiguous=False, fallback="fail", customer=None):
+        # Takes seats out of sale for ttl seconds while the customer pays.
+        # Holds are not journaled: only the sale they turn into is.
+        holds = self.hold_wheel()
+        holds.advance()
+        seat_map = self.get_seat_map(show_time)
+        with self.show_lock(show_time):
+            if contiguous:
+                held_seats = seat_map.allocate_contiguous(num_tickets, fallback)
+            else:
+                held_seats = seat_map.allocate(num_tickets)
+            seat_map.hold(held_seats)
+            self.update_availability(show_time, seat_map)
+            return holds.add(self, movie, show_time, held_seats, ttl, customer)
+
+    def book_hold(self, hold_id, customer=None):
+        hold = self.holds.get(hold_id) if self.holds is not None else None
+        if hold is None or hold.theater is not self:
+            raise ValueError(f"Unknown or expired hold: #{hold_id}")
+        seat_map = self.get_seat_map(hold.show_time)
+        with self.show_lock(hold.show_time):
+            # Whoever pops the hold first owns it, so a hold that is expiring
+            # right now is either sold here or released by the wheel, never both.
+            if self.holds.pop(hold_id) is None:
+                raise ValueError(f"Unknown or expired hold: #{hold_id}")
+            if hold.expires_at <= self.holds.clock():
+                seat_map.release_held(hold.seats)
+                self.update_availability(hold.show_time, seat_map)
+                raise ValueError(f"Unknown or expired hold: #{hold_id}")
+            try:
+                seat_map.sell_held(hold.seats)
+            except ValueError:
+                # The hold is gone, so whatever it still held goes back on sale
+                seat_map.release_held(hold.seats)
+                self.update_availability(hold.show_time, seat_map)
+                raise
+            return self.record_booking(hold.movie, hold.show_time, hold.seats, customer or hold.customer)
+
+    def release_hold(self, hold):
+        # A show removed since the hold was placed took its seats with it.
+        if not self.has_show(hold.show_time):
+            return
+        seat_map = self.get_seat_map(hold.show_time)
+        with self.show_lock(hold.show_time):
+            seat_map.release_held(hold.seats)
+            self.update_availability(hold.show_time, seat_map)
+
+    def claim_seats(self, movie, show_time, seat_numbers, customer=None):
+        seat_map = self.get_seat_map(show_time)
+        with self.show_lock(show_time):
+            booked_seats = seat_map.claim(seat_numbers)
+            self.update_availability(show_time, seat_map)
+            return self.record_booking(movie, show_time, booked_seats, customer)
+
+    def cancel_booking(self, movie, show_time, seat_numbers, booking_id=None):
+        seat_map = self.get_seat_map(show_time)
+        with self.show_lock(show_time):
+            if booking_id is not None:
+                # Checked under the lock: a cancel of the same booking that
+                # won a race, or a resale of its seats since, means only
+                # the seats booking_id still owns may be freed
+                owners = self.bookings.seat_owners if self.bookings is not None else {}
+                seat_numbers = [seat for seat in seat_numbers if owners.get((self.name, show_time, seat)) == booking_id]
+                if not seat_numbers:
+                    raise ValueError(f"Unknown booking: #{booking_id}")
+            # Held seats belong to a hold, which frees them when it expires
+            held = [seat for seat in seat_numbers if seat_map.is_held(seat)]
+            if held:
+                raise ValueError(f"Seats are held, not booked: {held}")
+            seat_map.release(seat_numbers)
+            self.update_availability(show_time, seat_map)
+            if self.bookings is not None:
+                self.bookings.release_seats(self.name, show_time, seat_numbers)
+            self.log("cancel", show_time.isoformat(), list(seat_numbers))
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+class JsonStorage:
+    # The original JSON snapshot file plus the append-only journal beside it.
+    def __init__(self, filename, snapshot_every=1000, sync=False, group_commit=False):
+        self.filename = filename
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+        self.group_commit = group_commit
+        self.journal = None
+
+    def open_journal(self, ticket_system):
+        # Bookings are appended to <filename>.journal as they happen and
+        # folded into a fresh snapshot every snapshot_every records, so a
+        # save costs O(changes) instead of O(total seats).
+        self.journal = BookingJournal(self.filename + ".journal", self.snapshot_every,
+                                      lambda: self.save(ticket_system), self.sync, self.group_commit)
+        return self.journal
+
+    def save(self, ticket_system):
         data = {
             "theaters": [
                 {
@@ -92,26 +1278,518 @@ class TicketSystem:
                         }
                         for movie in theater.movies
                     ],
-                    "seats": {st.isoformat(): seats for st, seats in theater.seats.items()}
+                    "seats": theater.encoded_seats(ticket_system.seat_format)
                 }
-                for theater in self.theaters
-            ]
+                for theater in ticket_system.theaters
+            ],
+            "bookings": [booking.to_data() for booking in list(ticket_system.bookings.bookings.values())],
+            "next_booking_id": ticket_system.bookings.next_id,
         }
-        with open(filename, 'w') as f:
+        # Write the snapshot beside the old one and swap it in, so a crash
+        # mid-save never leaves a half-written file behind.
+        with open(self.filename + ".tmp", 'w') as f:
             json.dump(data, f)
+        os.replace(self.filename + ".tmp", self.filename)
+        if self.journal:
+            self.journal.truncate()
+
+    def load(self, ticket_system, lazy=True):
+        # Theaters are parsed and built one at a time straight off the file
+        # instead of json.load-ing the whole snapshot first.
+        journal_file = self.filename + ".journal"
+        try:
+            f = open(self.filename, 'r')
+        except FileNotFoundError:
+            if not os.path.exists(journal_file):
+                raise
+            f = None
+        ticket_system.clear()
+        if f:
+            with f:
+                for key, value in iter_snapshot(f):
+                    if key == "theater":
+                        self.add_loaded_theater(ticket_system, Theater.from_data(value, lazy))
+                    elif key == "bookings":
+                        for booking_data in value:
+                            ticket_system.restore_booking(Booking.from_data(booking_data))
+                    elif key == "next_booking_id":
+                        ticket_system.bookings.next_id = max(ticket_system.bookings.next_id, value)
+        ticket_system.replay_journal(journal_file)
 
-    def load_from_file(self, filename):
-        with open(filename, 'r') as f:
-            data = json.load(f)
+    def add_loaded_theater(self, ticket_system, theater):
+        # Files from before theater names were unique can list a name more
+        # than once; the later ones are kept under "name (2)", "name (3)"...
+        name, copy = theater.name, 2
+        while ticket_system.get_theater(theater.name) is not None:
+            theater.name = f"{name} ({copy})"
+            copy += 1
+        if theater.name != name:
+            warnings.warn(f"Duplicate theater {name!r} in {self.filename} loaded as {theater.name!r}")
+        ticket_system.add_theater(theater)
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
+class SqliteStorage:
+    # Keeps the system in a SQLite database in WAL mode. As a journal it
+    # only notes which shows changed; every commit_every records those
+    # shows' seat bitsets and bookings are written in one transaction, so
+    # the cost follows the activity, not the size of the chain.
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS theaters (name TEXT PRIMARY KEY, capacity INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS movies (
+            theater TEXT NOT NULL, title TEXT NOT NULL, duration INTEGER, rating TEXT,
+            PRIMARY KEY (theater, title));
+        CREATE TABLE IF NOT EXISTS shows (
+            theater TEXT NOT NULL, show_time TEXT NOT NULL, title TEXT NOT NULL, seats BLOB NOT NULL,
+            PRIMARY KEY (theater, show_time));
+        CREATE TABLE IF NOT EXISTS bookings (
+            booking_id INTEGER PRIMARY KEY, theater TEXT NOT NULL, title TEXT NOT NULL,
+            show_time TEXT NOT NULL, seats TEXT NOT NULL, customer TEXT);
+        CREATE INDEX IF NOT EXISTS bookings_by_show ON bookings (theater, show_time);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+    """
+
+    def __init__(self, filename, commit_every=100, sync=False, group_commit=False):
+        # group_commit leaves every commit to the caller's commit() calls.
+        self.filename = filename
+        self.commit_every = commit_every
+        self.group_commit = group_commit
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"PRAGMA synchronous={'FULL' if sync else 'NORMAL'}")
+        self.connection.executescript(self.SCHEMA)
+        self.ticket_system = None
+        # False until the database holds the whole of ticket_system
+        self.synced = False
+        self.dirty_shows = set()
+        self.records = 0
+        self.lock = threading.RLock()
+
+    def open_journal(self, ticket_system):
+        # The database may be empty or hold another state, so a system that
+        # already has theaters is written in full now, before any booking
+        # holds a show lock. An empty one is written in full by the first
+        # flush, unless it is loaded from the database first.
+        self.ticket_system = ticket_system
+        self.synced = False
+        if ticket_system.theaters:
+            self.write_all(ticket_system)
+            self.synced = True
+        return self
+
+    def append(self, record):
+        op, name = record[0], record[1]
+        with self.lock:
+            if op in ("book", "cancel"):
+                self.dirty_shows.add((name, record[2]))
+            elif op == "theater":
+                self.connection.execute("INSERT OR REPLACE INTO theaters VALUES (?, ?)", (name, record[2]))
+            elif op == "remove_theater":
+                for table, column in (("theaters", "name"), ("movies", "theater"), ("shows", "theater"), ("bookings", "theater")):
+                    self.connection.execute(f"DELETE FROM {table} WHERE {column} = ?", (name,))
+            elif op == "movie":
+                title, duration, rating, show_times = record[2:]
+                self.connection.execute("INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?)", (name, title, duration, rating))
+                for st in show_times:
+                    self.add_show(name, title, st)
+            elif op == "show":
+                self.add_show(name, record[2], record[3])
+            elif op == "remove_movie":
+                self.connection.execute("DELETE FROM movies WHERE theater = ? AND title = ?", (name, record[2]))
+                self.connection.execute("DELETE FROM shows WHERE theater = ? AND title = ?", (name, record[2]))
+                self.connection.execute("DELETE FROM bookings WHERE theater = ? AND title = ?", (name, record[2]))
+            self.records += 1
+            if self.records >= self.commit_every and not self.group_commit:
+                self.flush()
+
+    def commit(self):
+        with self.lock:
+            if self.records:
+                self.flush()
+
+    def add_show(self, theater_name, title, show_time):
+        self.connection.execute("INSERT OR REPLACE INTO shows VALUES (?, ?, ?, ?)", (theater_name, show_time, title, b""))
+        self.dirty_shows.add((theater_name, show_time))
+
+    def flush(self):
+        # Writes the current seats and bookings of every show changed since
+        # the last commit, then commits.
+        with self.lock:
+            ticket_system = self.ticket_system
+            if not self.synced:
+                self.write_all(ticket_system)
+                self.synced = True
+                self.dirty_shows.clear()
+                self.records = 0
+                return
+            show_rows, booking_rows, cleared = [], [], []
+            for theater_name, st in self.dirty_shows:
+                theater = ticket_system.get_theater(theater_name)
+                show_time = datetime.fromisoformat(st)
+                if theater is None or not theater.has_show(show_time):
+                    continue
+                show_rows.append((theater.seat_bytes(show_time), theater_name, st))
+                cleared.append((theater_name, st))
+                for booking_id in list(ticket_system.bookings.show_bookings.get((theater_name, show_time), ())):
+                    booking = ticket_system.bookings.get(booking_id)
+                    if booking:
+                        booking_rows.append(self.booking_row(booking))
+            self.connection.executemany("UPDATE shows SET seats = ? WHERE theater = ? AND show_time = ?", show_rows)
+            self.connection.executemany("DELETE FROM bookings WHERE theater = ? AND show_time = ?", cleared)
+            self.connection.executemany("INSERT OR REPLACE INTO bookings VALUES (?, ?, ?, ?, ?, ?)", booking_rows)
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('next_booking_id', ?)", (ticket_system.bookings.next_id,))
+            self.connection.commit()
+            self.dirty_shows.clear()
+            self.records = 0
+
+    @staticmethod
+    def booking_row(booking):
+        return (booking.booking_id, booking.theater_name, booking.movie_title,
+                booking.show_time.isoformat(), json.dumps(booking.seats), booking.customer)
+
+    def save(self, ticket_system):
+        if self.ticket_system is ticket_system:
+            self.flush()
+        else:
+            self.write_all(ticket_system)
+
+    def write_all(self, ticket_system):
+        # Replaces the whole database with ticket_system, in one transaction.
+        # Flushes run under a show lock, so seats are read with seat_bytes,
+        # which never takes one.
+        with self.lock:
+            connection = self.connection
+            for table in ("theaters", "movies", "shows", "bookings", "meta"):
+                connection.execute(f"DELETE FROM {table}")
+            connection.executemany("INSERT INTO theaters VALUES (?, ?)",
+                                   [(t.name, t.capacity) for t in ticket_system.theaters])
+            connection.executemany("INSERT INTO movies VALUES (?, ?, ?, ?)", [
+                (t.name, m.title, m.duration, m.rating) for t in ticket_system.theaters for m in t.movies
+            ])
+            connection.executemany("INSERT INTO shows VALUES (?, ?, ?, ?)", [
+                (t.name, st.isoformat(), m.title, t.seat_bytes(st))
+                for t in ticket_system.theaters for m in t.movies for st in m.show_times if t.has_show(st)
+            ])
+            connection.executemany("INSERT INTO bookings VALUES (?, ?, ?, ?, ?, ?)",
+                                   [self.booking_row(b) for b in list(ticket_system.bookings.bookings.values())])
+            connection.execute("INSERT INTO meta VALUES ('next_booking_id', ?)", (ticket_system.bookings.next_id,))
+            connection.commit()
+
+    def load(self, ticket_system, lazy=True):
+        connection = self.connection
+        theaters = {
+            name: {"name": name, "capacity": capacity, "movies": [], "seats": {}}
+            for name, capacity in connection.execute("SELECT name, capacity FROM theaters")
+        }
+        if not theaters:
+            raise FileNotFoundError(f"No theaters stored in {self.filename}")
+        movies = {}
+        for theater_name, title, duration, rating in connection.execute("SELECT * FROM movies"):
+            movie_data = {"title": title, "duration": duration, "rating": rating, "show_times": []}
+            theaters[theater_name]["movies"].append(movie_data)
+            movies[(theater_name, title)] = movie_data
+        for theater_name, st, title, seats in connection.execute("SELECT * FROM shows ORDER BY theater, show_time"):
+            movies[(theater_name, title)]["show_times"].append(st)
+            theaters[theater_name]["seats"][st] = bytes(seats) or [True] * theaters[theater_name]["capacity"]
+        ticket_system.clear()
+        for theater_data in theaters.values():
+            ticket_system.add_theater(Theater.from_data(theater_data, lazy))
+        for booking_id, theater_name, title, st, seats, customer in connection.execute("SELECT * FROM bookings"):
+            ticket_system.restore_booking(
+                Booking(booking_id, theater_name, title, datetime.fromisoformat(st), json.loads(seats), customer))
+        row = connection.execute("SELECT value FROM meta WHERE key = 'next_booking_id'").fetchone()
+        if row:
+            ticket_system.bookings.next_id = max(ticket_system.bookings.next_id, row[0])
+        if ticket_system is self.ticket_system:
+            with self.lock:
+                self.synced = True
+                self.dirty_shows.clear()
+                self.records = 0
+
+    def close(self):
+        with self.lock:
+            if self.ticket_system:
+                self.flush()
+            self.connection.close()
+
+class TicketSystem:
+    def __init__(self, concurrent=False, seat_format="list", metrics=False):
         self.theaters = []
-        for theater_data in data["theaters"]:
-            theater = Theater(theater_data["name"], theater_data["capacity"])
-            for movie_data in theater_data["movies"]:
-                movie = Movie(movie_data["title"], movie_data["duration"], movie_data["rating"])
-                movie.show_times = [datetime.fromisoformat(st) for st in movie_data["show_times"]]
-                theater.add_movie(movie)
-            theater.seats = {datetime.fromisoformat(st): seats for st, seats in theater_data["seats"].items()}
-            self.add_theater(theater)
+        self.theater_index = {}
+        self.journal = None
+        self.storage = None
+        self.locks = LockStripes() if concurrent else None
+        self.bookings = BookingRegistry()
+        self.holds = HoldWheel()
+        # Built on the first availability search, then kept up to date.
+        self.availability = None
+        self.metrics = Metrics(metrics)
+        self.metrics.attach(self, "book_many", "save_to_file", "load_from_file")
+        # "list" keeps the original JSON lists of booleans; "binary" stores
+        # each show as a base64 bitset that is decoded lazily on load.
+        self.seat_format = seat_format
+
+    def add_theater(self, theater):
+        if theater.name in self.theater_index:
+            raise ValueError(f"Theater already exists: {theater.name}")
+        self.theaters.append(theater)
+        self.theater_index[theater.name] = theater
+        theater.journal = self.journal
+        theater.locks = self.locks
+        self.metrics.attach(theater, "book_ticket", "cancel_booking")
+        if theater.bookings is not None:
+            for booking in theater.bookings.bookings.values():
+                if booking.booking_id in self.bookings.bookings:
+                    booking.booking_id = None
+                self.bookings.add(booking.theater_name, booking.movie_title, booking.show_time,
+                                  booking.seats, booking.customer, booking.booking_id)
+        theater.bookings = self.bookings
+        if theater.holds is not None:
+            for hold in list(theater.holds.holds.values()):
+                theater.holds.pop(hold.hold_id)
+                theater.release_hold(hold)
+        theater.holds = self.holds
+        if self.availability is not None:
+            theater.index_availability(self.availability)
+        if self.journal:
+            self.journal.append(["theater", theater.name, theater.capacity])
+            for movie in theater.movies:
+                theater.log_movie(movie)
+
+    def remove_theater(self, theater):
+        self.theaters.remove(theater)
+        del self.theater_index[theater.name]
+        self.holds.drop(theater)
+        for show_time in [*theater.seats, *theater.pending_seats]:
+            self.bookings.drop_show(theater.name, show_time)
+            if self.availability is not None:
+                self.availability.discard(theater.name, show_time)
+        theater.bookings = None
+        theater.holds = None
+        theater.availability = None
+        self.metrics.detach(theater)
+        theater.journal = None
+        if self.journal:
+            self.journal.append(["remove_theater", theater.name])
+
+    def get_theater(self, name):
+        return self.theater_index.get(name)
+
+    def expire_holds(self):
+        return self.holds.advance()
+
+    def get_booking(self, booking_id):
+        return self.bookings.get(booking_id)
+
+    def customer_bookings(self, customer):
+        return self.bookings.customer_bookings(customer)
+
+    def cancel_booking(self, booking_id):
+        booking = self.bookings.get(booking_id)
+        if booking is None:
+            raise ValueError(f"Unknown booking: #{booking_id}")
+        theater = self.get_theater(booking.theater_name)
+        theater.cancel_booking(theater.get_movie(booking.movie_title), booking.show_time, list(booking.seats), booking_id)
+        return booking
+
+    def book_many(self, requests, atomic=False):
+        # Books many (theater name, movie title, show time, num tickets
+        # [, contiguous[, customer]]) lines at once. Lines are grouped by
+        # show and each show's seats are allocated in one pass under its
+        # lock. With atomic=True every line is booked or none is; otherwise
+        # each line succeeds or fails on its own. Returns (True, Booking) or
+        # (False, error message) per line, in request order.
+        self.holds.advance()
+        results = [None] * len(requests)
+        groups = {}
+        # Lines naming the same show are validated once.
+        checked = {}
+        for i, (theater_name, title, show_time, num_tickets, *options) in enumerate(requests):
+            show = checked.get((theater_name, title, show_time))
+            if show is None:
+                theater = self.get_theater(theater_name)
+                movie = theater.get_movie(title) if theater else None
+                if theater is None:
+                    show = f"Theater not found: {theater_name}"
+                elif movie is None:
+                    show = f"Movie not found: {title}"
+                elif not theater.has_show(show_time):
+                    show = "Invalid show time"
+                else:
+                    show = (theater, movie, groups.setdefault((theater, show_time), []))
+                checked[(theater_name, title, show_time)] = show
+            if isinstance(show, str):
+                results[i] = (False, show)
+                continue
+            contiguous = options[0] if options else False
+            customer = options[1] if len(options) > 1 else None
+            show[2].append((i, show[1], num_tickets, contiguous, customer))
+        if atomic and any(results):
+            return self.failed_batch(results)
+        # Seat maps are fetched first: materializing one takes its show lock.
+        seat_maps = {show: show[0].get_seat_map(show[1]) for show in groups}
+        with ExitStack() as held:
+            if atomic and self.locks:
+                for lock in self.locks.locks_for((theater.name, show_time) for theater, show_time in groups):
+                    held.enter_context(lock)
+            allocations = []
+            for (theater, show_time), lines in groups.items():
+                seat_map = seat_maps[(theater, show_time)]
+                with nullcontext() if atomic else theater.show_lock(show_time):
+                    allocated = theater.allocate_lines(seat_map, [(line[2], line[3]) for line in lines])
+                    if not atomic:
+                        theater.record_lines(show_time, seat_map, lines, allocated, results)
+                allocations.append((theater, show_time, seat_map, lines, allocated))
+            if not atomic:
+                return results
+            if any(isinstance(seats, ValueError) for *_, allocated in allocations for seats in allocated):
+                for theater, show_time, seat_map, lines, allocated in allocations:
+                    seat_map.release([seat for seats in allocated if not isinstance(seats, ValueError) for seat in seats])
+                    for (i, *_), seats in zip(lines, allocated):
+                        if isinstance(seats, ValueError):
+                            results[i] = (False, str(seats))
+                return self.failed_batch(results)
+            for theater, show_time, seat_map, lines, allocated in allocations:
+                theater.record_lines(show_time, seat_map, lines, allocated, results)
+        return results
+
+    @staticmethod
+    def failed_batch(results):
+        return [result or (False, "Not booked: another line in the batch failed") for result in results]
+
+    def availability_index(self):
+        if self.availability is None:
+            availability = AvailabilityIndex()
+            for theater in self.theaters:
+                theater.index_availability(availability)
+            self.availability = availability
+        return self.availability
+
+    def find_shows(self, start, end, num_seats=1, contiguous=False):
+        # Shows in every theater starting in [start, end) with num_seats
+        # free (adjacent, when contiguous), as (theater, movie, show time,
+        # free count, longest run).
+        results = []
+        shows = self.availability_index().search(start, end, num_seats, contiguous)
+        for theater_name, show_time, free_count, longest_run in shows:
+            theater = self.get_theater(theater_name)
+            results.append((theater, theater.movie_at(show_time), show_time, free_count, longest_run))
+        return results
+
+    def display_theaters(self):
+        for theater in self.theaters:
+            print(f"{theater.name} (Capacity: {theater.capacity})")
+
+    def attach_journal(self, journal):
+        self.journal = journal
+        for theater in self.theaters:
+            theater.journal = journal
+
+    def open_journal(self, filename, snapshot_every=1000, sync=False, group_commit=False):
+        # Records every change through the storage backend for filename:
+        # a JSON journal with snapshots every snapshot_every records, or a
+        # SQLite database committed every snapshot_every records. With
+        # group_commit, changes are only made durable by commit_journal().
+        if filename.endswith(SQLITE_EXTENSIONS):
+            self.storage = SqliteStorage(filename, snapshot_every, sync, group_commit)
+        else:
+            self.storage = JsonStorage(filename, snapshot_every, sync, group_commit)
+        self.attach_journal(self.storage.open_journal(self))
+
+    def commit_journal(self):
+        if self.journal:
+            self.journal.commit()
+
+    def close_journal(self):
+        if self.journal:
+            self.journal.close()
+        self.attach_journal(None)
+        self.storage = None
+
+    def clear(self):
+        for theater in self.theaters:
+            self.metrics.detach(theater)
+        self.theaters = []
+        self.theater_index = {}
+        self.bookings = BookingRegistry()
+        self.availability = None
+
+    def restore_booking(self, booking):
+        self.bookings.add(booking.theater_name, booking.movie_title, booking.show_time,
+                          booking.seats, booking.customer, booking.booking_id)
+
+    def apply_record(self, record):
+        op, name = record[0], record[1]
+        if op == "theater":
+            if self.get_theater(name) is None:
+                self.add_theater(Theater(name, record[2]))
+            return
+        theater = self.get_theater(name)
+        if theater is None:
+            return
+        if op == "remove_theater":
+            self.remove_theater(theater)
+        elif op == "movie":
+            title, duration, rating, show_times = record[2:]
+            if theater.get_movie(title) is None:
+                theater.add_movie(Movie(title, duration, rating))
+            for st in show_times:
+                self.apply_record(["show", name, title, st])
+        elif op == "remove_movie":
+            movie = theater.get_movie(record[2])
+            if movie:
+                theater.remove_movie(movie)
+        elif op == "show":
+            movie, show_time = theater.get_movie(record[2]), datetime.fromisoformat(record[3])
+            if movie and not theater.has_show(show_time):
+                theater.add_show_time(movie, show_time)
+        elif op == "book":
+            show_time, seats = datetime.fromisoformat(record[2]), record[3]
+            seat_map = theater.get_seat_map(show_time)
+            seat_map.mark_booked(seats)
+            theater.update_availability(show_time, seat_map)
+            if len(record) > 4:
+                booking_id, title, customer = record[4:7]
+                if booking_id not in self.bookings.bookings:
+                    self.bookings.add(name, title, show_time, seats, customer, booking_id)
+        elif op == "cancel":
+            show_time = datetime.fromisoformat(record[2])
+            seat_map = theater.get_seat_map(show_time)
+            seat_map.release(record[3])
+            theater.update_availability(show_time, seat_map)
+            self.bookings.release_seats(name, show_time, record[3])
+
+    def replay_journal(self, filename):
+        for record in BookingJournal.read(filename):
+            self.apply_record(record)
+
+    def storage_for(self, filename):
+        if self.storage and self.storage.filename == filename:
+            return self.storage
+        if filename.endswith(SQLITE_EXTENSIONS):
+            return SqliteStorage(filename)
+        return JsonStorage(filename)
+
+    def save_to_file(self, filename):
+        storage = self.storage_for(filename)
+        try:
+            storage.save(self)
+        finally:
+            if storage is not self.storage:
+                storage.close()
+
+    def load_from_file(self, filename, lazy=True):
+        storage = self.storage_for(filename)
+        journal = self.journal
+        self.attach_journal(None)
+        try:
+            storage.load(self, lazy)
+        finally:
+            self.attach_journal(journal)
+            if storage is not self.storage:
+                storage.close()
 
 def main():
     ticket_system = TicketSystem()
@@ -120,6 +1798,7 @@ def main():
         print("Data loaded successfully.")
     except FileNotFoundError:
         print("No existing data found. Starting with an empty system.")
+    ticket_system.open_journal("ticket_system_data.json")
 
     while True:
         print("\nMovie Ticket Management System")
@@ -137,21 +1816,33 @@ def main():
             name = input("Enter theater name: ")
             capacity = int(input("Enter theater capacity: "))
             theater = Theater(name, capacity)
-            ticket_system.add_theater(theater)
-            print("Theater added successfully!")
+            try:
+                ticket_system.add_theater(theater)
+                print("Theater added successfully!")
+            except ValueError as e:
+                print(e)
 
         elif choice == "2":
             theater_name = input("Enter theater name: ")
-            theater = next((t for t in ticket_system.theaters if t.name == theater_name), None)
+            theater = ticket_system.get_theater(theater_name)
             if theater:
                 title = input("Enter movie title: ")
-                duration = int(input("Enter movie duration (in minutes): "))
-                rating = input("Enter movie rating: ")
-                movie = Movie(title, duration, rating)
-                show_time = input("Enter show time (YYYY-MM-DD HH:MM): ")
-                movie.add_show_time(datetime.strptime(show_time, "%Y-%m-%d %H:%M"))
-                theater.add_movie(movie)
-                print("Movie added successfully!")
+                movie = theater.get_movie(title)
+                try:
+                    if movie:
+                        show_time = input("Enter show time (YYYY-MM-DD HH:MM): ")
+                        theater.add_show_time(movie, datetime.strptime(show_time, "%Y-%m-%d %H:%M"))
+                        print("Show time added successfully!")
+                    else:
+                        duration = int(input("Enter movie duration (in minutes): "))
+                        rating = input("Enter movie rating: ")
+                        movie = Movie(title, duration, rating)
+                        show_time = input("Enter show time (YYYY-MM-DD HH:MM): ")
+                        movie.add_show_time(datetime.strptime(show_time, "%Y-%m-%d %H:%M"))
+                        theater.add_movie(movie)
+                        print("Movie added successfully!")
+                except ValueError as e:
+                    print(f"Could not add show: {e}")
             else:
                 print("Theater not found.")
 
@@ -160,7 +1851,7 @@ def main():
 
         elif choice == "4":
             theater_name = input("Enter theater name: ")
-            theater = next((t for t in ticket_system.theaters if t.name == theater_name), None)
+            theater = ticket_system.get_theater(theater_name)
             if theater:
                 theater.display_movies()
             else:
@@ -168,16 +1859,18 @@ def main():
 
         elif choice == "5":
             theater_name = input("Enter theater name: ")
-            theater = next((t for t in ticket_system.theaters if t.name == theater_name), None)
+            theater = ticket_system.get_theater(theater_name)
             if theater:
                 movie_title = input("Enter movie title: ")
-                movie = next((m for m in theater.movies if m.title == movie_title), None)
+                movie = theater.get_movie(movie_title)
                 if movie:
                     show_time = datetime.strptime(input("Enter show time (YYYY-MM-DD HH:MM): "), "%Y-%m-%d %H:%M")
                     num_tickets = int(input("Enter number of tickets: "))
+                    together = input("Seat the group together? (y/n): ").strip().lower() == "y"
+                    customer = input("Enter customer name (optional): ").strip() or None
                     try:
-                        booked_seats = theater.book_ticket(movie, show_time, num_tickets)
-                        print(f"Tickets booked successfully! Seat numbers: {booked_seats}")
+                        booking = theater.book_ticket(movie, show_time, num_tickets, together, "split", customer)
+                        print(f"Tickets booked successfully! Booking #{booking.booking_id}, seat numbers: {booking.seats}")
                     except ValueError as e:
                         print(f"Booking failed: {e}")
                 else:
@@ -186,11 +1879,19 @@ def main():
                 print("Theater not found.")
 
         elif choice == "6":
+            booking_id = input("Enter booking ID (leave blank to cancel by seat numbers): ").strip().lstrip("#")
+            if booking_id:
+                try:
+                    booking = ticket_system.cancel_booking(int(booking_id))
+                    print(f"Booking {booking} cancelled successfully!")
+                except ValueError as e:
+                    print(f"Cancellation failed: {e}")
+                continue
             theater_name = input("Enter theater name: ")
-            theater = next((t for t in ticket_system.theaters if t.name == theater_name), None)
+            theater = ticket_system.get_theater(theater_name)
             if theater:
                 movie_title = input("Enter movie title: ")
-                movie = next((m for m in theater.movies if m.title == movie_title), None)
+                movie = theater.get_movie(movie_title)
                 if movie:
                     show_time = datetime.strptime(input("Enter show time (YYYY-MM-DD HH:MM): "), "%Y-%m-%d %H:%M")
                     seat_numbers = list(map(int, input("Enter seat numbers to cancel (comma-separated): ").split(",")))
@@ -206,6 +1907,7 @@ def main():
 
         elif choice == "7":
             ticket_system.save_to_file("ticket_system_data.json")
+            ticket_system.close_journal()
             print("Data saved. Goodbye!")
             break
 
@@ -0,0 +1,267 @@
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_ticket_system():
+    # The ticket system lives in a script whose file name has spaces, so it
+    # is loaded by path instead of with a plain import.
+    spec = importlib.util.spec_from_file_location(
+        "movie_ticket_management_system", os.path.join(HERE, "movie ticket management system.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+mts = load_ticket_system()
+
+
+# Operations a shard understands. Arguments and results are plain values
+# (strings, ints, lists) so they pickle cheaply over the pipe; show times
+# travel as ISO strings.
+
+def find_theater(ticket_system, theater_name):
+    theater = ticket_system.get_theater(theater_name)
+    if theater is None:
+        raise ValueError(f"Theater not found: {theater_name}")
+    return theater
+
+
+def find_movie(theater, title):
+    movie = theater.get_movie(title)
+    if movie is None:
+        raise ValueError(f"Movie not found: {title}")
+    return movie
+
+
+def op_add_theater(ticket_system, theater_name, capacity):
+    ticket_system.add_theater(mts.Theater(theater_name, capacity))
+
+
+def op_add_movie(ticket_system, theater_name, title, duration, rating, show_times):
+    movie = mts.Movie(title, duration, rating)
+    movie.show_times = [datetime.fromisoformat(st) for st in show_times]
+    find_theater(ticket_system, theater_name).add_movie(movie)
+
+
+def op_book_ticket(ticket_system, theater_name, title, show_time, num_tickets, contiguous=False, customer=None):
+    theater = find_theater(ticket_system, theater_name)
+    booking = theater.book_ticket(find_movie(theater, title), datetime.fromisoformat(show_time),
+                                  num_tickets, contiguous, "fail", customer)
+    return booking.booking_id, booking.seats
+
+
+def op_cancel_seats(ticket_system, theater_name, title, show_time, seat_numbers):
+    theater = find_theater(ticket_system, theater_name)
+    theater.cancel_booking(find_movie(theater, title), datetime.fromisoformat(show_time), seat_numbers)
+
+
+def op_cancel_booking(ticket_system, booking_id):
+    return ticket_system.cancel_booking(booking_id).seats
+
+
+def op_free_seats(ticket_system, theater_name, show_time):
+    return find_theater(ticket_system, theater_name).get_seat_map(datetime.fromisoformat(show_time)).free_count
+
+
+def op_shows_between(ticket_system, theater_name, start, end):
+    theater = find_theater(ticket_system, theater_name)
+    return [
+        (show_start.isoformat(), show_end.isoformat(), movie.title)
+        for show_start, show_end, movie in theater.shows_between(datetime.fromisoformat(start), datetime.fromisoformat(end))
+    ]
+
+
+OPS = {
+    "add_theater": op_add_theater,
+    "add_movie": op_add_movie,
+    "book_ticket": op_book_ticket,
+    "cancel_seats": op_cancel_seats,
+    "cancel_booking": op_cancel_booking,
+    "free_seats": op_free_seats,
+    "shows_between": op_shows_between,
+}
+
+
+def shard_main(conn, data_file):
+    # One shard: its own TicketSystem (and journal, when data_file is set)
+    # answering one batch of requests per message until it receives None.
+    ticket_system = mts.TicketSystem()
+    if data_file:
+        try:
+            ticket_system.load_from_file(data_file)
+        except FileNotFoundError:
+            pass
+        ticket_system.open_journal(data_file)
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        replies = []
+        for op, args in batch:
+            # Any failure is sent back as that request's error; letting it
+            # escape would kill the shard and every theater it serves.
+            try:
+                replies.append((True, OPS[op](ticket_system, *args)))
+            except ValueError as e:
+                replies.append((False, str(e)))
+            except Exception as e:
+                replies.append((False, f"{type(e).__name__}: {e}"))
+        conn.send(replies)
+    if data_file:
+        ticket_system.save_to_file(data_file)
+        ticket_system.close_journal()
+    conn.close()
+
+
+class ShardedTicketSystem:
+    # Theaters are spread over worker processes by a stable hash of their
+    # name, so each process books for its own theaters without sharing a
+    # GIL with the rest. Booking IDs are made global as local_id *
+    # num_shards + shard, which lets cancel_booking find the shard again.
+    def __init__(self, num_shards, data_file=None):
+        self.connections = []
+        self.processes = []
+        for index in range(num_shards):
+            shard_file = None
+            if data_file:
+                root, ext = os.path.splitext(data_file)
+                shard_file = f"{root}.shard{index}{ext}"
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=shard_main, args=(child_conn, shard_file), daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    @property
+    def num_shards(self):
+        return len(self.connections)
+
+    def shard_for(self, theater_name):
+        # crc32 rather than hash(), which is salted differently per process.
+        return zlib.crc32(theater_name.encode()) % self.num_shards
+
+    def route(self, op, args):
+        if op == "cancel_booking":
+            booking_id = args[0]
+            return booking_id % self.num_shards, (booking_id // self.num_shards,)
+        return self.shard_for(args[0]), args
+
+    def execute(self, requests):
+        # Sends every shard its share of the requests as one message, then
+        # collects the replies, so all shards work on a batch at once.
+        # Returns (ok, result) per request, in request order.
+        batches = [[] for _ in self.connections]
+        positions = [[] for _ in self.connections]
+        for position, (op, *args) in enumerate(requests):
+            shard, args = self.route(op, args)
+            batches[shard].append((op, args))
+            positions[shard].append(position)
+        for conn, batch in zip(self.connections, batches):
+            if batch:
+                conn.send(batch)
+        results = [None] * len(requests)
+        for shard, (conn, batch) in enumerate(zip(self.connections, batches)):
+            if not batch:
+                continue
+            for position, (op, _), (ok, result) in zip(positions[shard], batch, conn.recv()):
+                if ok and op == "book_ticket":
+                    booking_id, seats = result
+                    result = (booking_id * self.num_shards + shard, seats)
+                results[position] = (ok, result)
+        return results
+
+    def call(self, op, *args):
+        ok, result = self.execute([(op, *args)])[0]
+        if not ok:
+            raise ValueError(result)
+        return result
+
+    def add_theater(self, theater_name, capacity):
+        self.call("add_theater", theater_name, capacity)
+
+    def add_movie(self, theater_name, title, duration, rating, show_times):
+        self.call("add_movie", theater_name, title, duration, rating, [st.isoformat() for st in show_times])
+
+    def book_ticket(self, theater_name, title, show_time, num_tickets, contiguous=False, customer=None):
+        return self.call("book_ticket", theater_name, title, show_time.isoformat(), num_tickets, contiguous, customer)
+
+    def cancel_booking(self, booking_id):
+        return self.call("cancel_booking", booking_id)
+
+    def free_seats(self, theater_name, show_time):
+        return self.call("free_seats", theater_name, show_time.isoformat())
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+        for conn in self.connections:
+            conn.close()
+
+
+def populate(system, num_theaters, capacity, shows_per_theater):
+    start = datetime(2025, 1, 1, 10, 0)
+    show_times = [start + timedelta(hours=3 * s) for s in range(shows_per_theater)]
+    for t in range(num_theaters):
+        system.add_theater(f"Theater {t}", capacity)
+        system.add_movie(f"Theater {t}", f"Movie {t}", 120, "PG", show_times)
+    return show_times
+
+
+def generate_requests(num_requests, num_theaters, show_times, seed):
+    rng = random.Random(seed)
+    return [
+        ("book_ticket", f"Theater {t}", f"Movie {t}", rng.choice(show_times).isoformat(), rng.randint(1, 4))
+        for t in (rng.randrange(num_theaters) for _ in range(num_requests))
+    ]
+
+
+def run_load(num_shards, args):
+    system = ShardedTicketSystem(num_shards)
+    try:
+        show_times = populate(system, args.theaters, args.capacity, args.shows)
+        requests = generate_requests(args.requests, args.theaters, show_times, args.seed)
+        start = time.perf_counter()
+        booked = 0
+        for i in range(0, len(requests), args.batch):
+            booked += sum(ok for ok, _ in system.execute(requests[i:i + args.batch]))
+        elapsed = time.perf_counter() - start
+    finally:
+        system.close()
+    return booked, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the sharded ticket system")
+    parser.add_argument("--shards", default="1,2,4,8", help="comma-separated shard counts to try")
+    parser.add_argument("--theaters", type=int, default=64)
+    parser.add_argument("--shows", type=int, default=4)
+    parser.add_argument("--capacity", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=512, help="requests sent per round trip")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{args.requests:,} booking requests over {args.theaters} theaters, "
+          f"batches of {args.batch}, {os.cpu_count()} CPUs")
+    print(f"{'shards':>7} {'booked':>9} {'seconds':>8} {'bookings/s':>12}")
+    for num_shards in (int(n) for n in args.shards.split(",")):
+        booked, elapsed = run_load(num_shards, args)
+        print(f"{num_shards:>7} {booked:>9,} {elapsed:>8.2f} {booked / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+import importlib.util
+import json
+import random
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_ticket_system():
+    # The ticket system lives in a script whose file name has spaces, so it
+    # is loaded by path instead of with a plain import.
+    spec = importlib.util.spec_from_file_location(
+        "movie_ticket_management_system", os.path.join(HERE, "movie ticket management system.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+mts = load_ticket_system()
+
+SHOW = datetime(2026, 1, 1, 18, 0)
+LATE_SHOW = datetime(2026, 1, 1, 21, 0)
+
+
+def make_system():
+    ticket_system = mts.TicketSystem()
+    theater = mts.Theater("Odeon", 20)
+    ticket_system.add_theater(theater)
+    movie = mts.Movie("Heat", 170, "R")
+    movie.add_show_time(SHOW)
+    theater.add_movie(movie)
+    return ticket_system, theater, movie
+
+
+def test_sqlite_open_journal_then_save_keeps_existing_state(tmp_path):
+    filename = str(tmp_path / "tickets.db")
+    ticket_system, theater, movie = make_system()
+    booking = theater.book_ticket(movie, SHOW, 3, customer="ann")
+    ticket_system.open_journal(filename)
+    ticket_system.save_to_file(filename)
+    ticket_system.close_journal()
+
+    loaded = mts.TicketSystem()
+    loaded.load_from_file(filename)
+    assert loaded.get_booking(booking.booking_id).seats == booking.seats
+    assert loaded.get_theater("Odeon").get_seat_map(SHOW).free_count == 17
+    assert loaded.bookings.next_id == ticket_system.bookings.next_id
+
+
+def test_sqlite_journal_on_lazily_loaded_system_does_not_deadlock(tmp_path):
+    filename = str(tmp_path / "tickets.db")
+    ticket_system, theater, movie = make_system()
+    theater.add_show_time(movie, LATE_SHOW)
+    theater.book_ticket(movie, SHOW, 2)
+    ticket_system.save_to_file(filename)
+
+    # One stripe for every show, so the late show, still pending, shares
+    # the lock the booking holds
+    loaded = mts.TicketSystem(concurrent=True)
+    loaded.locks = mts.LockStripes(1)
+    loaded.load_from_file(filename, lazy=True)
+    loaded.open_journal(filename, snapshot_every=1)
+    loaded_theater = loaded.get_theater("Odeon")
+    booker = threading.Thread(target=loaded_theater.book_ticket,
+                              args=(loaded_theater.get_movie("Heat"), SHOW, 3), daemon=True)
+    booker.start()
+    booker.join(5)
+    assert not booker.is_alive()
+    loaded.close_journal()
+
+    reloaded = mts.TicketSystem()
+    reloaded.load_from_file(filename)
+    assert reloaded.get_theater("Odeon").get_seat_map(SHOW).free_count == 15
+
+
+def test_legacy_file_with_duplicate_theaters_loads_both(tmp_path):
+    filename = str(tmp_path / "legacy.json")
+    theaters = [
+        {"name": "Odeon", "capacity": 3, "movies": [{"title": "Heat", "duration": 170, "rating": "R",
+                                                     "show_times": [SHOW.isoformat()]}],
+         "seats": {SHOW.isoformat(): [True, False, True]}},
+        {"name": "Odeon", "capacity": 2, "movies": [{"title": "Alien", "duration": 117, "rating": "R",
+                                                     "show_times": [LATE_SHOW.isoformat()]}],
+         "seats": {LATE_SHOW.isoformat(): [False, False]}},
+    ]
+    with open(filename, "w") as f:
+        json.dump({"theaters": theaters}, f)
+
+    ticket_system = mts.TicketSystem()
+    with pytest.warns(UserWarning, match="Duplicate theater 'Odeon'"):
+        ticket_system.load_from_file(filename)
+    assert [theater.name for theater in ticket_system.theaters] == ["Odeon", "Odeon (2)"]
+    assert ticket_system.get_theater("Odeon").get_seat_map(SHOW).free_count == 2
+    assert ticket_system.get_theater("Odeon (2)").get_movie("Alien") is not None
+
+
+def test_partial_cancellation_keeps_the_rest_of_the_booking():
+    ticket_system, theater, movie = make_system()
+    booking = theater.book_ticket(movie, SHOW, 4, customer="ann")
+    cancelled, kept = booking.seats[:1], booking.seats[1:]
+    theater.cancel_booking(movie, SHOW, cancelled)
+    assert ticket_system.get_booking(booking.booking_id).seats == kept
+    assert ticket_system.bookings.owner("Odeon", SHOW, cancelled[0]) is None
+    assert ticket_system.bookings.owner("Odeon", SHOW, kept[0]) is booking
+
+    theater.cancel_booking(movie, SHOW, kept)
+    assert ticket_system.get_booking(booking.booking_id) is None
+    assert ticket_system.customer_bookings("ann") == []
+    assert theater.get_seat_map(SHOW).free_count == 20
+
+
+def test_customer_history_in_booking_order():
+    ticket_system, theater, movie = make_system()
+    first = theater.book_ticket(movie, SHOW, 2, customer="ann")
+    theater.book_ticket(movie, SHOW, 1, customer="bob")
+    second = theater.book_ticket(movie, SHOW, 3, customer="ann")
+    assert ticket_system.customer_bookings("ann") == [first, second]
+
+    ticket_system.cancel_booking(first.booking_id)
+    assert ticket_system.customer_bookings("ann") == [second]
+    with pytest.raises(ValueError):
+        ticket_system.cancel_booking(first.booking_id)
+
+
+def test_remove_movie_and_theater_drop_their_bookings():
+    ticket_system, theater, movie = make_system()
+    other = mts.Movie("Alien", 117, "R")
+    other.add_show_time(LATE_SHOW)
+    theater.add_movie(other)
+    dropped = theater.book_ticket(movie, SHOW, 2, customer="ann")
+    kept = theater.book_ticket(other, LATE_SHOW, 2, customer="ann")
+
+    theater.remove_movie(movie)
+    assert ticket_system.get_booking(dropped.booking_id) is None
+    assert ticket_system.customer_bookings("ann") == [kept]
+
+    ticket_system.remove_theater(theater)
+    assert len(ticket_system.bookings) == 0
+    assert ticket_system.customer_bookings("ann") == []
+
+
+def test_journal_replay_and_snapshot_keep_booking_ids(tmp_path):
+    filename = str(tmp_path / "tickets.json")
+    ticket_system = mts.TicketSystem()
+    ticket_system.open_journal(filename)
+    theater = mts.Theater("Odeon", 20)
+    ticket_system.add_theater(theater)
+    movie = mts.Movie("Heat", 170, "R")
+    movie.add_show_time(SHOW)
+    theater.add_movie(movie)
+    first = theater.book_ticket(movie, SHOW, 2, customer="ann")
+    second = theater.book_ticket(movie, SHOW, 3, customer="bob")
+    ticket_system.cancel_booking(first.booking_id)
+    ticket_system.close_journal()
+
+    # No snapshot was taken, so everything comes back from the journal
+    replayed = mts.TicketSystem()
+    replayed.load_from_file(filename)
+    assert replayed.get_booking(first.booking_id) is None
+    assert replayed.get_booking(second.booking_id).seats == second.seats
+    assert replayed.bookings.next_id == ticket_system.bookings.next_id
+
+    replayed.save_to_file(filename)
+    os.remove(filename + ".journal")
+    loaded = mts.TicketSystem()
+    loaded.load_from_file(filename)
+    assert loaded.get_booking(second.booking_id).customer == "bob"
+    assert loaded.bookings.next_id == ticket_system.bookings.next_id
+    loaded_theater = loaded.get_theater("Odeon")
+    third = loaded_theater.book_ticket(loaded_theater.get_movie("Heat"), SHOW, 1)
+    assert third.booking_id == ticket_system.bookings.next_id
+
+
+def make_system_with_clock(num_slots=1024):
+    clock = [0.0]
+    ticket_system = mts.TicketSystem()
+    ticket_system.holds = mts.HoldWheel(num_slots=num_slots, clock=lambda: clock[0])
+    theater = mts.Theater("Odeon", 20)
+    ticket_system.add_theater(theater)
+    movie = mts.Movie("Heat", 170, "R")
+    movie.add_show_time(SHOW)
+    theater.add_movie(movie)
+    return ticket_system, theater, movie, clock
+
+
+def test_expiry_survives_removed_shows():
+    ticket_system, theater, movie, clock = make_system_with_clock()
+    other = mts.Movie("Alien", 117, "R")
+    other.add_show_time(LATE_SHOW)
+    theater.add_movie(other)
+    theater.hold_seats(movie, SHOW, 2, ttl=10)
+    theater.hold_seats(other, LATE_SHOW, 3, ttl=10)
+
+    theater.remove_movie(movie)
+    assert len(ticket_system.holds) == 1
+    clock[0] = 20
+    theater.book_ticket(other, LATE_SHOW, 1)
+    assert len(ticket_system.holds) == 0
+    seat_map = theater.get_seat_map(LATE_SHOW)
+    assert seat_map.held_bits == 0
+    assert seat_map.free_count == 19
+
+
+def test_cancel_by_seat_number_leaves_held_seats_alone():
+    ticket_system, theater, movie, clock = make_system_with_clock()
+    hold = theater.hold_seats(movie, SHOW, 2)
+    with pytest.raises(ValueError, match="held"):
+        theater.cancel_booking(movie, SHOW, hold.seats[:1])
+    booking = theater.book_hold(hold.hold_id)
+    assert booking.seats == hold.seats
+    assert theater.get_seat_map(SHOW).held_bits == 0
+
+
+def test_failed_sale_of_a_hold_releases_its_seats():
+    ticket_system, theater, movie, clock = make_system_with_clock()
+    hold = theater.hold_seats(movie, SHOW, 2)
+    seat_map = theater.get_seat_map(SHOW)
+    seat_map.release(hold.seats[:1])
+    with pytest.raises(ValueError, match="no longer held"):
+        theater.book_hold(hold.hold_id)
+    assert seat_map.held_bits == 0
+    assert seat_map.free_count == 20
+
+
+def test_stale_cancel_does_not_free_resold_seats():
+    ticket_system, theater, movie = make_system()
+    theater.get_seat_map(SHOW).claim(range(3, 21))
+    ann = theater.book_ticket(movie, SHOW, 2, customer="ann")
+    ticket_system.cancel_booking(ann.booking_id)
+    bob = theater.book_ticket(movie, SHOW, 2, customer="bob")
+    assert bob.seats == ann.seats
+
+    with pytest.raises(ValueError, match="Unknown booking"):
+        ticket_system.cancel_booking(ann.booking_id)
+    # The loser of two racing cancels gets here with the booking it looked
+    # up before the winner removed it
+    with pytest.raises(ValueError, match="Unknown booking"):
+        theater.cancel_booking(movie, SHOW, ann.seats, ann.booking_id)
+    assert ticket_system.get_booking(bob.booking_id) is bob
+    assert theater.get_seat_map(SHOW).free_count == 0
+
+
+def test_claim_rejects_duplicate_seats():
+    ticket_system, theater, movie = make_system()
+    with pytest.raises(ValueError, match="Duplicate seat number: 3"):
+        theater.claim_seats(movie, SHOW, [3, 3])
+    assert len(ticket_system.bookings) == 0
+    assert theater.get_seat_map(SHOW).free_count == 20
+
+
+def test_seat_map_allocates_lowest_free_seats_and_releases_them():
+    seat_map = mts.SeatMap(10)
+    assert seat_map.allocate(3) == [1, 2, 3]
+    assert seat_map.free_count == 7
+    seat_map.release([2])
+    assert seat_map.allocate(2) == [2, 4]
+    assert not seat_map.is_free(4) and seat_map.is_free(5)
+    with pytest.raises(ValueError, match="Only 6 seats left"):
+        seat_map.allocate(7)
+    with pytest.raises(ValueError):
+        seat_map.allocate(0)
+
+
+def test_seat_map_claim_is_all_or_nothing():
+    seat_map = mts.SeatMap(10)
+    seat_map.claim([4, 5])
+    with pytest.raises(ValueError, match=r"Seats already booked: \[5\]"):
+        seat_map.claim([6, 5, 7])
+    assert seat_map.free_count == 8
+    assert seat_map.is_free(6) and seat_map.is_free(7)
+    with pytest.raises(ValueError, match="Invalid seat number: 11"):
+        seat_map.claim([11])
+
+
+def test_seat_map_encodings_round_trip():
+    seat_map = mts.SeatMap(13)
+    seat_map.claim([1, 8, 9, 13])
+    seats = seat_map.to_list()
+    assert seats == [seat not in (1, 8, 9, 13) for seat in range(1, 14)]
+    for copy in (mts.SeatMap.from_list(13, seats), mts.SeatMap.from_bytes(13, seat_map.to_bytes()),
+                 mts.SeatMap.decode(13, seat_map.to_binary())):
+        assert copy.free_bits == seat_map.free_bits
+        assert copy.free_count == 9
+
+
+def test_held_seats_are_saved_as_free():
+    seat_map = mts.SeatMap(4)
+    seat_map.hold(seat_map.allocate(2))
+    assert seat_map.free_count == 2
+    assert seat_map.is_held(1) and not seat_map.is_free(1)
+    assert mts.SeatMap.from_bytes(4, seat_map.to_bytes()).free_count == 4
+
+
+def free_runs(bits, capacity):
+    # (first seat, length) of every free run, the slow way
+    runs, start = [], None
+    for seat in range(1, capacity + 2):
+        free = seat <= capacity and bits >> (seat - 1) & 1
+        if free and start is None:
+            start = seat
+        elif not free and start is not None:
+            runs.append((start, seat - start))
+            start = None
+    return runs
+
+
+def test_longest_free_run_and_run_tree_match_a_scan():
+    rng = random.Random(0)
+    for _ in range(200):
+        capacity = rng.randint(1, 70)
+        bits = rng.getrandbits(capacity) & rng.getrandbits(capacity)
+        runs = free_runs(bits, capacity)
+        longest = max((length for _, length in runs), default=0)
+        tree = mts.SeatRunTree(capacity, bits)
+        assert mts.longest_free_run(bits) == longest
+        assert tree.longest_run() == longest
+        for num_seats in range(1, longest + 2):
+            expected = next((start for start, length in runs if length >= num_seats), 0)
+            assert tree.find(num_seats) == expected
+
+
+def test_run_tree_follows_seat_changes():
+    seat_map = mts.SeatMap(10)
+    seat_map.run_tree()
+    seat_map.claim([4, 8])
+    assert seat_map.longest_run() == 3
+    assert seat_map.allocate_contiguous(3) == [1, 2, 3]
+    seat_map.release([4])
+    assert seat_map.runs.find(4) == 4
+    assert seat_map.longest_run() == 4
+
+
+def test_contiguous_fallbacks():
+    seat_map = mts.SeatMap(8)
+    seat_map.claim([3, 6])
+    with pytest.raises(ValueError, match="Longest run is 2"):
+        seat_map.allocate_contiguous(3)
+    assert seat_map.allocate_contiguous(3, fallback="split") == [1, 2, 4]
+    assert seat_map.allocate_contiguous(3, fallback="scatter") == [5, 7, 8]
+    assert seat_map.free_count == 0
+
+
+def test_show_schedule_rejects_clashes_and_finds_overlaps():
+    ticket_system, theater, movie = make_system()
+    short = mts.Movie("Short", 30, "G")
+    short.add_show_time(SHOW + timedelta(hours=2))
+    with pytest.raises(ValueError, match="clashes with Heat"):
+        theater.add_movie(short)
+    assert theater.get_movie("Short") is None
+
+    late = mts.Movie("Short", 30, "G")
+    late.add_show_time(LATE_SHOW)
+    theater.add_movie(late)
+    # Heat runs 18:00-20:50, so a window starting at 20:00 still sees it
+    shows = theater.shows_between(SHOW + timedelta(hours=2), LATE_SHOW)
+    assert [(start, m.title) for start, _, m in shows] == [(SHOW, "Heat")]
+    assert [m.title for _, _, m in theater.shows_between(SHOW, LATE_SHOW + timedelta(minutes=1))] == ["Heat", "Short"]
+    assert theater.movie_at(LATE_SHOW) is late
+
+
+def test_next_available_show_skips_full_shows():
+    ticket_system, theater, movie = make_system()
+    theater.add_show_time(movie, LATE_SHOW)
+    theater.book_ticket(movie, SHOW, 19)
+    assert theater.next_available_show(SHOW, 1) == (movie, SHOW)
+    assert theater.next_available_show(SHOW, 2) == (movie, LATE_SHOW)
+    assert theater.next_available_show(LATE_SHOW, 21) is None
+
+
+def test_holds_expire_after_their_ttl():
+    ticket_system, theater, movie, clock = make_system_with_clock()
+    hold = theater.hold_seats(movie, SHOW, 3, ttl=10)
+    seat_map = theater.get_seat_map(SHOW)
+    clock[0] = 10.5
+    assert ticket_system.expire_holds() == []
+    assert seat_map.free_count == 17
+
+    clock[0] = 11
+    assert ticket_system.expire_holds() == [hold]
+    assert seat_map.free_count == 20 and seat_map.held_bits == 0
+    with pytest.raises(ValueError, match="Unknown or expired hold"):
+        theater.book_hold(hold.hold_id)
+
+
+def test_holds_longer_than_a_turn_of_the_wheel_wait_their_turn():
+    ticket_system, theater, movie, clock = make_system_with_clock(num_slots=4)
+    short = theater.hold_seats(movie, SHOW, 1, ttl=1)
+    long = theater.hold_seats(movie, SHOW, 1, ttl=10)
+    clock[0] = 3
+    assert ticket_system.expire_holds() == [short]
+    clock[0] = 9
+    assert ticket_system.expire_holds() == []
+    assert theater.book_hold(long.hold_id).seats == long.seats
+    assert len(ticket_system.holds) == 0
+
+
+def test_hold_paid_in_time_becomes_a_booking():
+    ticket_system, theater, movie, clock = make_system_with_clock()
+    hold = theater.hold_seats(movie, SHOW, 2, customer="ann")
+    booking = theater.book_ticket(movie, SHOW, 2, hold_id=hold.hold_id)
+    assert booking.customer == "ann" and booking.seats == hold.seats
+    assert ticket_system.customer_bookings("ann") == [booking]
+    assert theater.get_seat_map(SHOW).free_count == 18
+
+
+def test_find_shows_follows_bookings_and_removals():
+    ticket_system, theater, movie = make_system()
+    other = mts.Theater("Rex", 5)
+    ticket_system.add_theater(other)
+    alien = mts.Movie("Alien", 117, "R")
+    alien.add_show_time(LATE_SHOW)
+    other.add_movie(alien)
+    day = (SHOW - timedelta(hours=18), SHOW + timedelta(hours=6))
+
+    shows = ticket_system.find_shows(*day)
+    assert [(t.name, st, free) for t, _, st, free, _ in shows] == [("Odeon", SHOW, 20), ("Rex", LATE_SHOW, 5)]
+    other.claim_seats(alien, LATE_SHOW, [3])
+    assert [t.name for t, *_ in ticket_system.find_shows(*day, num_seats=4)] == ["Odeon", "Rex"]
+    assert [t.name for t, *_ in ticket_system.find_shows(*day, num_seats=3, contiguous=True)] == ["Odeon"]
+    theater.book_ticket(movie, SHOW, 18)
+    assert [t.name for t, *_ in ticket_system.find_shows(*day, num_seats=3)] == ["Rex"]
+    assert ticket_system.find_shows(SHOW + timedelta(minutes=1), LATE_SHOW) == []
+
+    other.remove_movie(alien)
+    assert ticket_system.find_shows(*day, num_seats=3) == []
+    ticket_system.remove_theater(theater)
+    assert len(ticket_system.availability) == 0
+
+
+def test_availability_index_built_late_matches_one_kept_up_to_date():
+    ticket_system, theater, movie = make_system()
+    ticket_system.availability_index()
+    theater.add_show_time(movie, LATE_SHOW)
+    theater.book_ticket(movie, SHOW, 4)
+    booking = theater.book_ticket(movie, LATE_SHOW, 6)
+    ticket_system.cancel_booking(booking.booking_id)
+    kept = dict(ticket_system.availability.shows)
+
+    ticket_system.availability = None
+    assert ticket_system.availability_index().shows == kept == {
+        ("Odeon", SHOW): (16, 16), ("Odeon", LATE_SHOW): (20, 20)}
+
+
+def make_batch_system(concurrent):
+    ticket_system = mts.TicketSystem(concurrent=concurrent)
+    theater = mts.Theater("Odeon", 10)
+    ticket_system.add_theater(theater)
+    movie = mts.Movie("Heat", 170, "R")
+    movie.add_show_time(SHOW)
+    movie.add_show_time(LATE_SHOW)
+    theater.add_movie(movie)
+    ticket_system.availability_index()
+    return ticket_system, theater
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_book_many_atomic_rolls_back_every_line(concurrent):
+    ticket_system, theater = make_batch_system(concurrent)
+    theater.get_seat_map(LATE_SHOW).run_tree()
+    requests = [
+        ("Odeon", "Heat", SHOW, 4, False, "ann"),
+        ("Odeon", "Heat", LATE_SHOW, 3, True, "bob"),
+        ("Odeon", "Heat", SHOW, 7),
+    ]
+    results = ticket_system.book_many(requests, atomic=True)
+    assert [ok for ok, _ in results] == [False, False, False]
+    assert "Not enough seats" in results[2][1]
+    assert "another line in the batch failed" in results[0][1]
+    for show_time in (SHOW, LATE_SHOW):
+        seat_map = theater.get_seat_map(show_time)
+        assert seat_map.free_count == 10 and seat_map.longest_run() == 10
+        assert ticket_system.availability.get("Odeon", show_time) == (10, 10)
+    assert len(ticket_system.bookings) == 0
+
+    results = ticket_system.book_many(requests[:2] + [("Odeon", "Heat", SHOW, 6)], atomic=True)
+    assert all(ok for ok, _ in results)
+    assert results[1][1].seats == [1, 2, 3]
+    assert theater.get_seat_map(SHOW).free_count == 0
+
+
+def test_book_many_best_effort_books_what_it_can():
+    ticket_system, theater = make_batch_system(False)
+    results = ticket_system.book_many([
+        ("Odeon", "Heat", SHOW, 8, False, "ann"),
+        ("Odeon", "Heat", SHOW, 3),
+        ("Odeon", "Alien", SHOW, 1),
+        ("Odeon", "Heat", SHOW, 2, False, "bob"),
+    ])
+    assert [ok for ok, _ in results] == [True, False, False, True]
+    assert results[2][1] == "Movie not found: Alien"
+    assert results[0][1].seats == list(range(1, 9)) and results[3][1].seats == [9, 10]
+    assert [b.seats for b in ticket_system.customer_bookings("bob")] == [[9, 10]]
+    assert ticket_system.availability.get("Odeon", SHOW) == (0, 0)